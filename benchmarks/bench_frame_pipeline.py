@@ -0,0 +1,154 @@
+"""Measure the throughput of the camera's frame pipeline (MyDeque handoffs and the WorkerThread pool) without a camera.
+
+Run from the repository root with::
+
+    python benchmarks/bench_frame_pipeline.py
+
+A producer thread stands in for the capture thread, appending synthetic 1280x720 frames in free FrameRing buffers
+to the input deque as fast as the pipeline takes them (or at --fps), and the main thread stands in for the display,
+popping processed frames. Reported are the frames per second displayed, the share of frames dropped, and the mean
+latency from capture to display, for thread and process workers. The raw cost of a MyDeque append and pop, and of
+handing a frame to another thread and back, is measured too. Needs no window.
+"""
+import itertools
+import threading
+import time
+from types import SimpleNamespace
+
+from common import argument_parser, report, result
+
+import cv2
+import numpy as np
+
+from slideshow.videocapture import FrameRing, FrameStats, MyDeque, ProcessorPool, release_frame, ring_size
+
+FRAME_SHAPE = (720, 1280, 3)
+
+
+def blur(frame, out=None):
+    return cv2.GaussianBlur(frame, (9, 9), 0, dst=out)
+
+
+def synthetic_frames(ring, variants=8):
+    """Frames with a moving gradient, copied into free buffers of the ring as a camera would read them; yields
+    (frame, leases) with the leases to release once the frame has been dropped or displayed."""
+    gradient = np.linspace(0, 255, FRAME_SHAPE[1], dtype=np.uint8)[None, :, None]
+    sources = [np.ascontiguousarray(np.broadcast_to(np.roll(gradient, i * 64, axis=1), FRAME_SHAPE))
+               for i in range(variants)]
+    for i in itertools.count():
+        index, buf = ring.acquire(FRAME_SHAPE, np.uint8)
+        np.copyto(buf, sources[i % variants])
+        yield buf, ((ring, index),)
+
+
+def measure_pipeline(processor, workers, worker_type, duration, fps=None, in_place=False):
+    stats = FrameStats()
+    camera = SimpleNamespace(processor=processor, in_place=in_place, stats=stats,
+                             frame_input=MyDeque(stats=stats, on_drop=release_frame),
+                             frame_output=MyDeque(stats=stats, on_drop=release_frame))
+    pool = ProcessorPool(camera, workers, worker_type)
+    pool.start()
+
+    stop = threading.Event()
+
+    def produce():
+        frames = synthetic_frames(FrameRing(ring_size(workers)))
+        interval = 1. / fps if fps else 0
+        for seq in itertools.count():
+            if stop.is_set():
+                break
+            frame, leases = next(frames)
+            camera.frame_input.append((seq, frame, time.perf_counter(), leases))
+            stats.count('captured')
+            if interval:
+                time.sleep(interval)
+
+    displayed, latency = 0, 0.
+    producer = threading.Thread(target=produce, daemon=True)
+    warmup = 1. if worker_type == 'process' else 0.2  # for process workers to be spawned
+    producer.start()
+    end = time.perf_counter() + warmup
+    while time.perf_counter() < end:
+        try:
+            release_frame(camera.frame_output.pop(timeout=0.1))
+        except IndexError:
+            pass
+
+    captured = stats.captured
+    start = time.perf_counter()
+    while time.perf_counter() - start < duration:
+        try:
+            item = camera.frame_output.pop(timeout=0.1)
+        except IndexError:
+            continue
+        release_frame(item)
+        captured_at = item[1]
+        displayed += 1
+        latency += time.perf_counter() - captured_at
+    elapsed = time.perf_counter() - start
+    captured = stats.captured - captured
+
+    stop.set()
+    producer.join()
+    pool.stop()
+    return displayed / elapsed, 1 - displayed / max(captured, 1), latency / max(displayed, 1)
+
+
+def measure_deque(count):
+    stats = FrameStats()
+    deque = MyDeque(stats=stats)
+    frame = np.zeros(FRAME_SHAPE, np.uint8)
+    start = time.perf_counter()
+    for i in range(count):
+        deque.append((i, frame, 0))
+        deque.pop(block=False)
+    return count / (time.perf_counter() - start)
+
+
+def measure_deque_threads(count):
+    """Round trips per second of a frame handed to another thread and back through a pair of MyDeques."""
+    there, back = MyDeque(stats=FrameStats()), MyDeque(stats=FrameStats())
+    frame = np.zeros(FRAME_SHAPE, np.uint8)
+
+    def echo():
+        for _ in range(count):
+            back.append(there.pop())
+
+    echo_thread = threading.Thread(target=echo, daemon=True)
+    echo_thread.start()
+    start = time.perf_counter()
+    for i in range(count):
+        there.append((i, frame, 0))
+        back.pop()
+    elapsed = time.perf_counter() - start
+    echo_thread.join()
+    return count / elapsed
+
+
+def main():
+    parser = argument_parser(__doc__)
+    parser.add_argument('--duration', type=float, default=3., help='seconds each pipeline case runs for')
+    parser.add_argument('--fps', type=float, default=None, help='frame rate of the synthetic camera; default as fast '
+                                                                  'as the pipeline takes frames')
+    args = parser.parse_args()
+    duration = 0.5 if args.quick else args.duration
+    count = 20000 if args.quick else 200000
+
+    results = [result('frame_pipeline', 'MyDeque', 'append and pop', measure_deque(count), 'frames/s'),
+               result('frame_pipeline', 'MyDeque', 'round trip between threads',
+                      measure_deque_threads(count // 10), 'frames/s')]
+
+    cases = [('no processor', None, 1, 'thread', False)]
+    cases += [('blur %d thread%s' % (n, 's' if n > 1 else ''), blur, n, 'thread', False) for n in (1, 2, 4)]
+    cases += [('blur 2 threads in place', blur, 2, 'thread', True),
+              ('blur 2 processes', blur, 2, 'process', False)]
+    for name, processor, workers, worker_type, in_place in cases:
+        fps, dropped, latency = measure_pipeline(processor, workers, worker_type, duration, args.fps, in_place)
+        results += [result('frame_pipeline', name, 'displayed', fps, 'frames/s'),
+                    result('frame_pipeline', name, 'dropped', dropped * 100, '%'),
+                    result('frame_pipeline', name, 'latency', latency * 1000, 'ms')]
+    report(results, args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,60 @@
+"""Compare the direct texture upload in pil_to_kivy against the old PNG round trip, over image sizes and modes.
+
+Run from the repository root with::
+
+    python benchmarks/bench_pil_to_kivy.py
+
+Runs headless, in SDL's offscreen window unless SDL_VIDEODRIVER says otherwise.
+"""
+import timeit
+from io import BytesIO
+
+from common import argument_parser, report, result
+
+from PIL import Image
+from kivy.core.image import Image as CoreImage
+from kivy.core.window import Window  # noqa: F401 - creates the GL context
+
+from slideshow.base import pil_to_kivy
+
+SIZES = [(640, 360), (1920, 1080), (3840, 2160)]
+MODES = ['RGB', 'RGBA', 'L', 'P']
+
+
+def png_pil_to_kivy(canvas_img):
+    # the original implementation, kept here as the reference point
+    data = BytesIO()
+    canvas_img.save(data, format='png')
+    data.seek(0)
+    return CoreImage(BytesIO(data.read()), ext='png')
+
+
+def make_image(size, mode):
+    img = Image.linear_gradient('L').resize(size).convert('RGB')
+    img = Image.merge('RGB', (img.getchannel(0), img.getchannel(0).rotate(90), img.getchannel(0).rotate(180)))
+    if mode == 'P':
+        return img.quantize(64)
+    return img.convert(mode)
+
+
+def main():
+    parser = argument_parser(__doc__)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+    sizes = SIZES[:2] if args.quick else SIZES
+    repeat = 2 if args.quick else args.repeat
+
+    results = []
+    for size in sizes:
+        for mode in MODES:
+            img = make_image(size, mode)
+            case = '%dx%d %s' % (size[0], size[1], mode)
+            png = min(timeit.repeat(lambda: png_pil_to_kivy(img).texture, number=1, repeat=repeat))
+            direct = min(timeit.repeat(lambda: pil_to_kivy(img).texture, number=1, repeat=repeat))
+            results.append(result('pil_to_kivy', case, 'png', png * 1000, 'ms'))
+            results.append(result('pil_to_kivy', case, 'direct', direct * 1000, 'ms'))
+    report(results, args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+"""Measure keypress-to-execution latency of PythonREPLSlide and PythonCodeREPLSlide.
+
+Run from the repository root with::
+
+    python benchmarks/bench_repl_latency.py
+
+Enter is simulated on the slide's REPL input; the latency is the time until the entered line has run in the
+interpreter thread. Runs headless, in SDL's offscreen window unless SDL_VIDEODRIVER says otherwise.
+"""
+import random
+import threading
+import time
+
+from common import argument_parser, register_fonts, report, timing_results
+
+from kivy.clock import Clock
+from kivy.core.window import Window  # noqa: F401 - creates the GL context
+
+from slideshow import PythonCodeREPLSlide, PythonREPLSlide
+from slideshow.shells.python_shell import PythonREPLWidget
+
+TIMEOUT = 5
+THINK_TIME = 0.1
+
+
+def pump_until(condition, timeout=TIMEOUT):
+    deadline = time.perf_counter() + timeout
+    while not condition():
+        if time.perf_counter() > deadline:
+            raise TimeoutError('REPL did not respond')
+        Clock.tick()
+
+
+def find_repl(slide):
+    return next(w for w in slide.walk(restrict=True) if isinstance(w, PythonREPLWidget))
+
+
+def measure(slide, repeat):
+    slide.build()
+    repl = find_repl(slide)
+    ti = repl.text_input
+    executed = threading.Event()
+    repl.sh.locals['_executed'] = executed
+
+    pump_until(lambda: repl.prompt is not None)  # interpreter thread is up and waiting for input
+
+    latencies = []
+    for _ in range(repeat):
+        pump_until(lambda: ti.text.endswith(repl.prompt))
+        ti._cursor_pos = len(ti.text)
+        ti.text += '_executed.set()'
+        ti.cursor = ti.get_cursor_from_index(len(ti.text))
+        executed.clear()
+        time.sleep(random.uniform(0, THINK_TIME))  # don't always press enter at the same phase after the prompt
+
+        start = time.perf_counter()
+        ti.keyboard_on_key_down(None, (13, 'enter'), '\n', [])
+        if not executed.wait(TIMEOUT):  # execution must not depend on the UI clock ticking
+            raise TimeoutError('REPL did not respond')
+        latencies.append(time.perf_counter() - start)
+
+    slide.close()
+    return latencies
+
+
+def main():
+    parser = argument_parser(__doc__)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+    register_fonts()
+
+    results = []
+    for slide in (PythonREPLSlide(), PythonCodeREPLSlide()):
+        latencies = measure(slide, 5 if args.quick else args.repeat)
+        results += timing_results('repl_latency', type(slide).__name__, latencies)
+    report(results, args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,60 @@
+"""Measure how fast output printed in a PythonREPLWidget reaches its console, flushed per frame and in throughput mode.
+
+Run from the repository root with::
+
+    python benchmarks/bench_repl_output.py
+
+Code printing --lines lines is submitted to the REPL's interpreter while the main thread ticks the clock and draws
+frames; reported are the lines per second until the last line (and the prompt after it) is in the console, and the
+slowest frame meanwhile. Runs headless, in SDL's offscreen window unless SDL_VIDEODRIVER says otherwise.
+"""
+import time
+
+from common import argument_parser, frame, pump_until, register_fonts, report, result
+
+from kivy.core.window import Window
+
+from slideshow.shells.python_shell import PythonREPLWidget
+
+LINE = 'the quick brown fox jumps over the lazy dog'
+
+
+def measure(throughput, lines):
+    repl = PythonREPLWidget(throughput=throughput, size=Window.size, size_hint=(None, None))
+    Window.add_widget(repl)
+    text_input = repl.text_input
+    pump_until(lambda: repl.prompt is not None and text_input.text.endswith(repl.prompt))
+    for _ in range(5):
+        frame()
+
+    code = compile('for i in range(%d):\n    print(i, %r)\n' % (lines, LINE), '<benchmark>', 'exec')
+    expected = '%d %s\n%s' % (lines - 1, LINE, repl.prompt)
+
+    start = time.perf_counter()
+    repl.submit(lambda: repl.sh.runcode(code))
+    slowest = pump_until(lambda: text_input.text.endswith(expected))
+    total = time.perf_counter() - start
+
+    Window.remove_widget(repl)
+    repl.close()
+    return total, slowest
+
+
+def main():
+    parser = argument_parser(__doc__)
+    parser.add_argument('--lines', type=int, default=50000)
+    args = parser.parse_args()
+    register_fonts()
+    lines = 2000 if args.quick else args.lines
+
+    results = []
+    for throughput in (False, True):
+        total, slowest = measure(throughput, lines)
+        case = 'throughput' if throughput else 'per frame'
+        results += [result('repl_output', case, 'lines', lines / total, 'lines/s'),
+                    result('repl_output', case, 'slowest frame', slowest * 1000, 'ms')]
+    report(results, args)
+
+
+if __name__ == '__main__':
+    main()
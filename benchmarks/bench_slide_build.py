@@ -0,0 +1,84 @@
+"""Measure the build and teardown of PictureSlide and WrapperSlide, with the texture cache cold and warm.
+
+Run from the repository root with::
+
+    python benchmarks/bench_slide_build.py
+
+Pictures are loaded from a PNG file and from a PIL image. A cold build decodes and uploads the picture; a warm one
+finds its texture in the cache, because another slide still holds it. Runs headless, in SDL's offscreen window
+unless SDL_VIDEODRIVER says otherwise.
+"""
+import os
+import statistics
+import tempfile
+import time
+
+from common import argument_parser, report, result, timing_results
+
+from PIL import Image
+from kivy.core.window import Window  # noqa: F401 - creates the GL context
+
+from slideshow import PictureSlide, WrapperSlide
+from slideshow.base import texture_cache
+
+SIZE = (1920, 1080)
+
+
+def make_image(size, seed):
+    img = Image.linear_gradient('L').resize(size).rotate(seed * 37 % 360)
+    return Image.merge('RGB', (img, img.transpose(Image.Transpose.FLIP_LEFT_RIGHT), img.point(lambda v: 255 - v)))
+
+
+def time_builds(make_slide, repeat, warm):
+    builds, teardowns = [], []
+    holder = None
+    if warm:
+        holder = make_slide()
+        holder.build()  # keeps the textures referenced, so that they stay cached
+    for _ in range(repeat):
+        if not warm:
+            texture_cache.clear()
+        slide = make_slide()
+        start = time.perf_counter()
+        slide.build()
+        builds.append(time.perf_counter() - start)
+        start = time.perf_counter()
+        slide.teardown()
+        teardowns.append(time.perf_counter() - start)
+    if holder is not None:
+        holder.teardown()
+    texture_cache.clear()
+    return builds, teardowns
+
+
+def main():
+    parser = argument_parser(__doc__)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+    repeat = 3 if args.quick else args.repeat
+
+    with tempfile.TemporaryDirectory() as directory:
+        picture = os.path.join(directory, 'picture.png')
+        background = os.path.join(directory, 'background.png')
+        make_image(SIZE, 1).save(picture)
+        make_image(SIZE, 2).save(background)
+        image = make_image(SIZE, 3)
+
+        cases = [
+            ('PictureSlide file', lambda: PictureSlide(picture)),
+            ('PictureSlide PIL image', lambda: PictureSlide(image)),
+            ('WrapperSlide', lambda: WrapperSlide(background, PictureSlide(picture))),
+        ]
+        results = []
+        for name, make_slide in cases:
+            for warm in (False, True):
+                builds, teardowns = time_builds(make_slide, repeat, warm)
+                case = '%s %s' % (name, 'warm' if warm else 'cold')
+                results += timing_results('slide_build', case, builds)
+                results.append(result('slide_build', case, 'teardown median', statistics.median(teardowns) * 1000,
+                                      'ms'))
+    report(results, args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,111 @@
+"""Measure slide-switch latency in a 500-slide deck of pictures.
+
+Run from the repository root with::
+
+    python benchmarks/bench_slide_switch.py
+
+The deck is shown in the (offscreen) window and driven as a presenter would: stepping through it with next, and
+jumping to random slides with goto(). Each switch is timed up to the end of the first frame drawn after it, with a
+short dwell on each slide for the prefetcher to work in. Decks of slides constructed up front and of slides
+constructed lazily by a factory are compared, with and without prefetching. Runs headless, in SDL's offscreen
+window unless SDL_VIDEODRIVER says otherwise.
+"""
+import os
+import random
+import tempfile
+import time
+
+from common import argument_parser, frame, report, result, timing_results
+
+from PIL import Image, ImageDraw
+from kivy.core.window import Window
+
+from slideshow import PictureSlide, Slideshow
+from slideshow.base import texture_cache
+
+SLIDES = 500
+SIZE = (1280, 720)
+DWELL = 0.02  # seconds spent on each slide, drawing frames, before the next switch
+
+
+def make_pictures(directory, count):
+    background = Image.linear_gradient('L').resize(SIZE).convert('RGB')
+    paths = []
+    for i in range(count):
+        img = background.copy()
+        draw = ImageDraw.Draw(img)
+        draw.rectangle((40 + i % 50 * 20, 40, 240 + i % 50 * 20, 240), fill=(i * 7 % 256, i * 13 % 256, 200))
+        draw.text((60, 300), 'slide %d' % (i + 1), fill=(255, 255, 255))
+        path = os.path.join(directory, 'slide-%03d.png' % i)
+        img.save(path, compress_level=1)
+        paths.append(path)
+    return paths
+
+
+def dwell():
+    end = time.perf_counter() + DWELL
+    while time.perf_counter() < end:
+        frame()
+
+
+def run_deck(slideshow, order):
+    Window.add_widget(slideshow.root)
+    slideshow.root.size_hint = None, None
+    slideshow.root.size = Window.size
+    dwell()
+
+    switches, calls = [], []
+    for index in order:
+        start = time.perf_counter()
+        slideshow.goto(index)
+        called = time.perf_counter()
+        frame()
+        switches.append(time.perf_counter() - start)
+        calls.append(called - start)
+        dwell()
+
+    Window.remove_widget(slideshow.root)
+    slideshow.on_stop()
+    slideshow.current_slide.teardown()
+    texture_cache.clear()
+    return switches, calls
+
+
+def main():
+    parser = argument_parser(__doc__)
+    parser.add_argument('--slides', type=int, default=SLIDES)
+    parser.add_argument('--jumps', type=int, default=200)
+    args = parser.parse_args()
+    count = 60 if args.quick else args.slides
+    jumps = 30 if args.quick else args.jumps
+
+    random.seed(0)
+    forward = list(range(1, count))
+    jumps = [random.randrange(count) for _ in range(jumps)]
+    jumps = [index for previous, index in zip([0] + jumps, jumps) if index != previous]
+
+    with tempfile.TemporaryDirectory() as directory:
+        paths = make_pictures(directory, count)
+        cases = [
+            ('next', forward, {}),
+            ('next prefetch 2', forward, {'prefetch': 2}),
+            ('goto random', jumps, {}),
+            ('next lazy', forward, {'lazy': True}),
+            ('next lazy prefetch 2', forward, {'lazy': True, 'prefetch': 2}),
+        ]
+        results = []
+        for name, order, options in cases:
+            if options.pop('lazy', False):
+                slides, options['num_slides'] = (lambda i: PictureSlide(paths[i])), count
+            else:
+                slides = [PictureSlide(path) for path in paths]
+            slideshow = Slideshow(slides, *SIZE, **options)
+            switches, calls = run_deck(slideshow, order)
+            results += timing_results('slide_switch', name, switches)
+            results.append(result('slide_switch', name, 'switch call median', sorted(calls)[len(calls) // 2] * 1000,
+                                  'ms'))
+    report(results, args)
+
+
+if __name__ == '__main__':
+    main()
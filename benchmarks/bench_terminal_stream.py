@@ -0,0 +1,89 @@
+"""Stream 100k lines of command output into the TextInput console and the screen-buffer terminal.
+
+Run from the repository root with::
+
+    python benchmarks/bench_terminal_stream.py
+
+Output is dispatched from a separate thread in READ_SIZE chunks, as the command reader does, while the main
+thread ticks the clock and draws frames. Reported are the time until the last line is on screen, the slowest
+frame while streaming, and the time to draw a frame after scrolling up a page. Runs headless, in SDL's offscreen
+window unless SDL_VIDEODRIVER says otherwise.
+"""
+import threading
+import time
+
+from common import TIMEOUT, argument_parser, frame, register_fonts, report, result
+
+from kivy.core.window import Window
+
+from slideshow.shells.simple_cmd_shell import READ_SIZE, ShellConsole
+from slideshow.shells.terminal import TerminalConsole
+
+
+def last_line(console):
+    if isinstance(console, TerminalConsole):
+        screen = console.screen
+        return screen[screen.end_line - 2] if screen.end_line > 1 else ''
+    lines = console.console_input.text.rsplit('\n', 2)
+    return lines[-2] if len(lines) > 1 else ''
+
+
+def scroll_page(console):
+    if isinstance(console, TerminalConsole):
+        console.scroll_by(console.visible_rows)
+    else:
+        view = console.scroll_view
+        view.scroll_y = min(view.scroll_y + view.height / max(view.children[0].height, 1), 1)
+
+
+def measure(console_class, lines):
+    console = console_class(size=Window.size, size_hint=(None, None))
+    Window.add_widget(console)
+    for _ in range(5):
+        frame()
+
+    data = ''.join('%d: the quick brown fox jumps over the lazy dog\n' % i for i in range(lines))
+    chunks = [data[i:i + READ_SIZE] for i in range(0, len(data), READ_SIZE)]
+    expected = '%d: the quick brown fox jumps over the lazy dog' % (lines - 1)
+
+    def produce():
+        for chunk in chunks:
+            console.dispatch('on_output', chunk)
+        console.dispatch('on_complete', '')
+
+    start = time.perf_counter()
+    threading.Thread(target=produce, daemon=True).start()
+    slowest = 0
+    while last_line(console) != expected:
+        slowest = max(slowest, frame())
+        if time.perf_counter() - start > TIMEOUT:
+            raise TimeoutError('output was not displayed')
+    total = time.perf_counter() - start
+
+    frame()
+    scroll_page(console)
+    scroll = frame()
+
+    Window.remove_widget(console)
+    return total, slowest, scroll
+
+
+def main():
+    parser = argument_parser(__doc__)
+    parser.add_argument('--lines', type=int, default=100000)
+    args = parser.parse_args()
+    register_fonts()
+    lines = 5000 if args.quick else args.lines
+
+    results = []
+    for console_class in (ShellConsole, TerminalConsole):
+        total, slowest, scroll = measure(console_class, lines)
+        case = console_class.__name__
+        results += [result('terminal_stream', case, 'lines', lines / total, 'lines/s'),
+                    result('terminal_stream', case, 'slowest frame', slowest * 1000, 'ms'),
+                    result('terminal_stream', case, 'scroll frame', scroll * 1000, 'ms')]
+    report(results, args)
+
+
+if __name__ == '__main__':
+    main()
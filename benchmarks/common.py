@@ -0,0 +1,78 @@
+"""Shared by the benchmarks: the import path, a headless window, frame pumping and reporting results.
+
+Each benchmark prints a table of its results, or with --json one line of JSON that benchmarks/run.py collects.
+Results are dicts of benchmark, case, metric, value and unit; units ending in /s are better higher, the others
+(times) better lower.
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+sys.path.insert(0, ROOT)
+os.environ.setdefault('KIVY_NO_ARGS', '1')
+os.environ.setdefault('SDL_VIDEODRIVER', 'offscreen')  # no display needed; software GL is enough
+os.environ.setdefault('KCFG_GRAPHICS_MAXFPS', '0')  # frames are timed: don't sleep to cap the rate
+
+RESULTS_MARKER = 'BENCHMARK-RESULTS '
+TIMEOUT = 120
+
+
+def argument_parser(doc):
+    parser = argparse.ArgumentParser(description=doc.splitlines()[0])
+    parser.add_argument('--json', action='store_true', help='print the results as one line of JSON')
+    parser.add_argument('--quick', action='store_true', help='smaller workloads, e.g. to check the benchmark runs')
+    return parser
+
+
+def result(benchmark, case, metric, value, unit):
+    return {'benchmark': benchmark, 'case': case, 'metric': metric, 'value': value, 'unit': unit}
+
+
+def timing_results(benchmark, case, seconds):
+    """Median, 95th percentile and worst of a list of durations, in ms."""
+    seconds = sorted(seconds)
+    p95 = seconds[min(int(len(seconds) * 0.95), len(seconds) - 1)]
+    return [result(benchmark, case, 'median', statistics.median(seconds) * 1000, 'ms'),
+            result(benchmark, case, 'p95', p95 * 1000, 'ms'),
+            result(benchmark, case, 'max', seconds[-1] * 1000, 'ms')]
+
+
+def report(results, args):
+    if args.json:
+        print(RESULTS_MARKER + json.dumps(results), flush=True)
+        return
+
+    case_width = max([len(r['case']) for r in results] + [4])
+    metric_width = max([len(r['metric']) for r in results] + [6])
+    print(f"{'case':<{case_width}}  {'metric':<{metric_width}}  {'value':>12}")
+    for r in results:
+        print(f"{r['case']:<{case_width}}  {r['metric']:<{metric_width}}  {r['value']:>12.3f} {r['unit']}")
+
+
+def register_fonts():
+    # the consoles ask for 'RobotoMono-regular', which only resolves on case-insensitive file systems
+    from kivy.core.text import LabelBase
+    LabelBase.register('RobotoMono-regular', 'data/fonts/RobotoMono-Regular.ttf')
+
+
+def frame():
+    """Run one iteration of the event loop (clock, canvas updates and drawing); returns the time it took."""
+    from kivy.base import EventLoop
+    start = time.perf_counter()
+    EventLoop.idle()
+    return time.perf_counter() - start
+
+
+def pump_until(condition, timeout=TIMEOUT):
+    """Run frames until condition() is true; returns the slowest frame."""
+    deadline = time.perf_counter() + timeout
+    slowest = 0
+    while not condition():
+        if time.perf_counter() > deadline:
+            raise TimeoutError('timed out')
+        slowest = max(slowest, frame())
+    return slowest
@@ -0,0 +1,151 @@
+"""Run the benchmarks and write their results to a JSON file, optionally comparing them with an earlier run.
+
+Run from anywhere with::
+
+    python benchmarks/run.py
+    python benchmarks/run.py --compare benchmarks/results/<commit>.json
+
+Each benchmark runs in its own process, headless (SDL's offscreen window), with --json. The results are written to
+benchmarks/results/<commit>.json (with -dirty if there are uncommitted changes) unless --output says otherwise; the
+file holds the commit, the machine and every result, so that runs on different commits can be compared. --compare
+prints the change of each result and flags those that got worse by more than --threshold.
+"""
+import argparse
+import datetime
+import importlib.metadata
+import json
+import os
+import platform
+import subprocess
+import sys
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+RESULTS_DIR = os.path.join(BENCHMARK_DIR, 'results')
+RESULTS_MARKER = 'BENCHMARK-RESULTS '  # as in common.py, which isn't imported so that this doesn't start kivy
+BENCHMARKS = [
+    'bench_pil_to_kivy',
+    'bench_slide_build',
+    'bench_slide_switch',
+    'bench_frame_pipeline',
+    'bench_repl_output',
+    'bench_repl_latency',
+    'bench_terminal_stream',
+]
+ENVIRONMENT = {'KIVY_NO_ARGS': '1', 'KIVY_NO_CONSOLELOG': '1', 'SDL_VIDEODRIVER': 'offscreen'}
+
+
+def git_commit():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=BENCHMARK_DIR, capture_output=True, text=True,
+                                check=True).stdout.strip()
+        dirty = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=BENCHMARK_DIR,
+                               capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None, None
+    return commit, bool(dirty)
+
+
+def version(package):
+    try:
+        return importlib.metadata.version(package)
+    except importlib.metadata.PackageNotFoundError:
+        return None
+
+
+def run_benchmark(name, quick, timeout):
+    command = [sys.executable, os.path.join(BENCHMARK_DIR, name + '.py'), '--json'] + (['--quick'] if quick else [])
+    environment = dict(os.environ)
+    for key, value in ENVIRONMENT.items():
+        environment.setdefault(key, value)
+    completed = subprocess.run(command, capture_output=True, text=True, env=environment, timeout=timeout,
+                               cwd=os.path.join(BENCHMARK_DIR, '..'))
+    for line in completed.stdout.splitlines():
+        if line.startswith(RESULTS_MARKER):
+            return json.loads(line[len(RESULTS_MARKER):]), None
+    return [], (completed.stderr.strip().splitlines() or ['exited with %d' % completed.returncode])[-1]
+
+
+def key(result):
+    return result['benchmark'], result['case'], result['metric']
+
+
+def compare(results, baseline, threshold):
+    """Print how each result changed from the baseline; returns the number that regressed beyond threshold."""
+    previous = {key(r): r['value'] for r in baseline}
+    regressions = 0
+    for r in results:
+        old = previous.get(key(r))
+        if old is None or old == 0:
+            continue
+        change = (r['value'] - old) / abs(old)
+        worse = change < -threshold if r['unit'].endswith('/s') else change > threshold
+        regressions += worse
+        print(f"{'REGRESSION' if worse else '':>10}  {r['benchmark']}: {r['case']} {r['metric']} "
+              f"{old:.3f} -> {r['value']:.3f} {r['unit']} ({change:+.1%})")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--output', default=None,
+                        help='JSON file to write the results to; by default one in benchmarks/results, named '
+                             'after the commit')
+    parser.add_argument('--compare', default=None, help='JSON file of an earlier run to compare with')
+    parser.add_argument('--threshold', type=float, default=0.1, help='relative change counted as a regression')
+    parser.add_argument('--only', nargs='*', default=None, help='names of the benchmarks to run')
+    parser.add_argument('--quick', action='store_true', help='smaller workloads, e.g. to check the suite runs')
+    parser.add_argument('--timeout', type=float, default=900, help='seconds each benchmark may take')
+    args = parser.parse_args()
+
+    commit, dirty = git_commit()
+    run = {
+        'commit': commit,
+        'dirty': dirty,
+        'date': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        'quick': args.quick,
+        'machine': {
+            'platform': platform.platform(),
+            'processor': platform.processor() or platform.machine(),
+            'cpus': os.cpu_count(),
+            'python': platform.python_version(),
+            'kivy': version('kivy'),
+            'numpy': version('numpy'),
+        },
+        'results': [],
+        'errors': {},
+    }
+
+    for name in args.only or BENCHMARKS:
+        print(name, '...', flush=True)
+        try:
+            results, error = run_benchmark(name, args.quick, args.timeout)
+        except subprocess.TimeoutExpired:
+            results, error = [], 'timed out'
+        if error is not None:
+            print('  failed:', error)
+            run['errors'][name] = error
+        for r in results:
+            print(f"  {r['case']}: {r['metric']} {r['value']:.3f} {r['unit']}")
+        run['results'] += results
+
+    output = args.output
+    if output is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        output = os.path.join(RESULTS_DIR, '%s%s.json' % (commit or 'unknown', '-dirty' if dirty else ''))
+    with open(output, 'w') as file:
+        json.dump(run, file, indent=1)
+    print('\nresults written to', output)
+
+    regressions = 0
+    if args.compare is not None:
+        with open(args.compare) as file:
+            baseline = json.load(file)
+        print('\ncompared with', baseline.get('commit') or args.compare)
+        regressions = compare(run['results'], baseline['results'], args.threshold)
+
+    if run['errors'] or regressions:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
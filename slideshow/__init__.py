@@ -1,3 +1,4 @@
 from .base import Slide, Slideshow, VideoSlide, AudioVideoSlide, PictureSlide, WrapperSlide
+from .lazy import LazySlides
 from .codeslides import PythonCodeREPLSlide, PythonREPLSlide, TerminalSlide
 
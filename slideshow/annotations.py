@@ -0,0 +1,302 @@
+import mmap
+import os
+import struct
+from array import array
+
+import numpy as np
+from kivy.graphics import Color, InstructionGroup, Line
+
+STROKE_COLOR = (1, 0, 0, 1)
+STROKE_WIDTH = 2
+SIMPLIFY_TOLERANCE = 1.  # pixels a simplified stroke may stray from the points drawn
+LINE_CHUNK = 256  # points per Line instruction while a stroke is being drawn
+
+STORE_MAGIC = b'SSANNOT1'
+STROKE_RECORD = 1
+CLEAR_RECORD = 2
+# kind, hidden, slide index, colour (r, g, b, a), width, number of points; followed by the points as float32 x, y
+RECORD = struct.Struct('<BBxxI4ffI')
+
+
+def simplify(points, tolerance=SIMPLIFY_TOLERANCE):
+    """Ramer-Douglas-Peucker simplification of an array('f') of x, y coordinates; returns a new array."""
+    xy = np.frombuffer(points, dtype=np.float32).reshape(-1, 2)
+    if len(xy) < 3:
+        return array('f', points)
+
+    keep = np.zeros(len(xy), dtype=bool)
+    keep[0] = keep[-1] = True
+    spans = [(0, len(xy) - 1)]
+    while spans:
+        start, end = spans.pop()
+        if end - start < 2:
+            continue
+        a = xy[start]
+        d = xy[end] - a
+        between = xy[start + 1:end] - a
+        length = np.hypot(d[0], d[1])
+        if length == 0:
+            distances = np.hypot(between[:, 0], between[:, 1])
+        else:
+            distances = np.abs(d[0] * between[:, 1] - d[1] * between[:, 0]) / length
+        i = int(np.argmax(distances))
+        if distances[i] > tolerance:
+            furthest = start + 1 + i
+            keep[furthest] = True
+            spans.append((start, furthest))
+            spans.append((furthest, end))
+    return array('f', xy[keep].tobytes())
+
+
+class Stroke(object):
+    """A freehand line, with its points in a flat array('f') of x, y coordinates.
+
+    Points closer than the tolerance to the last one are dropped as they are added, and the whole stroke is
+    simplified when it is finished. While it is being drawn it is made of several Line instructions of up to
+    LINE_CHUNK points, so that adding a point doesn't copy all the points before it.
+    """
+
+    def __init__(self, color=STROKE_COLOR, width=STROKE_WIDTH, points=(), tolerance=SIMPLIFY_TOLERANCE):
+        self.color = tuple(color)
+        self.width = width
+        self.tolerance = tolerance
+        self.points = array('f', points)
+        self.finished = False
+        self.group = InstructionGroup()
+        self.group.add(Color(*self.color, mode='rgba'))
+        self._tail = list(self.points)  # points of the last Line
+        self._line = Line(points=self._tail, width=width)
+        self.group.add(self._line)
+
+    def add_point(self, x, y):
+        points = self.points
+        if len(points) >= 2:
+            dx, dy = x - points[-2], y - points[-1]
+            if dx * dx + dy * dy < self.tolerance * self.tolerance:
+                return
+        points.append(x)
+        points.append(y)
+
+        self._tail += (x, y)
+        self._line.points = self._tail
+        if len(self._tail) >= 2 * LINE_CHUNK:
+            self._tail = [x, y]  # the next Line carries on from this point
+            self._line = Line(points=self._tail, width=self.width)
+            self.group.add(self._line)
+
+    def finish(self):
+        if self.finished:
+            return
+        self.finished = True
+        self.points = simplify(self.points, self.tolerance)
+        self.group.clear()
+        self.group.add(Color(*self.color, mode='rgba'))
+        self._tail = self.points.tolist()
+        self._line = Line(points=self._tail, width=self.width)
+        self.group.add(self._line)
+
+
+class AnnotationLayer(object):
+    """The strokes drawn on one slide in one layer (over the slide, or over the blanked screen), all under one
+    InstructionGroup, so that showing, hiding or clearing them is a single canvas operation."""
+
+    def __init__(self):
+        self.strokes = []
+        self.group = InstructionGroup()
+        self.canvas = None
+
+    def __len__(self):
+        return len(self.strokes)
+
+    def add(self, stroke):
+        self.strokes.append(stroke)
+        self.group.add(stroke.group)
+        return stroke
+
+    def show(self, canvas):
+        self.hide()
+        canvas.add(self.group)
+        self.canvas = canvas
+
+    def hide(self):
+        if self.canvas is not None:
+            if self.canvas.indexof(self.group) > -1:  # a slide that was torn down has already cleared its canvas
+                self.canvas.remove(self.group)
+            self.canvas = None
+
+
+class AnnotationStore(object):
+    """Annotations in an append-only file, so that they outlive the slideshow.
+
+    The file is a magic number followed by records: a stroke (its slide, layer, colour, width and points as
+    float32 x, y pairs) or the clearing of a layer. Strokes are appended as they are finished, without rewriting
+    the file. When the store is opened, the record headers are scanned through a memory map to find the offsets
+    of each slide's strokes, and a slide's points are only read when the slide is loaded.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, 'a+b')
+        self._mmap = None
+        self._offsets = {}  # slide index -> [(hidden, offset of the stroke record)]
+        if os.path.getsize(path) == 0:
+            self._file.write(STORE_MAGIC)
+            self._file.flush()
+        self._scan()
+
+    def _map(self):
+        if self._mmap is not None:
+            self._mmap.close()
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def _scan(self):
+        self._map()
+        data = self._mmap
+        if data[:len(STORE_MAGIC)] != STORE_MAGIC:
+            raise ValueError("%s is not an annotation file" % self.path)
+
+        offset = len(STORE_MAGIC)
+        while offset + RECORD.size <= len(data):
+            kind, hidden, index, _, _, _, _, _, count = RECORD.unpack_from(data, offset)
+            end = offset + RECORD.size + count * 8
+            if end > len(data):
+                break
+            if kind == STROKE_RECORD:
+                self._offsets.setdefault(index, []).append((bool(hidden), offset))
+            elif kind == CLEAR_RECORD:
+                self._offsets[index] = [entry for entry in self._offsets.get(index, []) if entry[0] != hidden]
+            offset = end
+
+        if offset < len(data):
+            # the end of a record that was being written when the slideshow stopped
+            self._mmap.close()
+            self._mmap = None
+            self._file.truncate(offset)
+            self._file.seek(0, os.SEEK_END)  # truncate() leaves the position (which append() records) past the end
+            self._map()
+
+    def __contains__(self, index):
+        return bool(self._offsets.get(index))
+
+    def slides(self):
+        return sorted(index for index, entries in self._offsets.items() if entries)
+
+    def read(self, index):
+        """The strokes of a slide, as (hidden, colour, width, points) in the order they were drawn."""
+        entries = self._offsets.get(index, [])
+        if entries and entries[-1][1] >= len(self._mmap):
+            self._map()  # strokes have been appended since the file was mapped
+        for hidden, offset in entries:
+            _, _, _, r, g, b, a, width, count = RECORD.unpack_from(self._mmap, offset)
+            start = offset + RECORD.size
+            yield hidden, (r, g, b, a), width, array('f', self._mmap[start:start + count * 8])
+
+    def append(self, index, hidden, stroke):
+        self._offsets.setdefault(index, []).append((hidden, self._file.tell()))
+        self._file.write(RECORD.pack(STROKE_RECORD, hidden, index, *stroke.color, stroke.width,
+                                     len(stroke.points) // 2))
+        self._file.write(stroke.points.tobytes())
+        self._file.flush()
+
+    def append_clear(self, index, hidden):
+        self._offsets[index] = [entry for entry in self._offsets.get(index, []) if entry[0] != hidden]
+        self._file.write(RECORD.pack(CLEAR_RECORD, hidden, index, 0, 0, 0, 0, 0, 0))
+        self._file.flush()
+
+    def close(self):
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+        self._file.close()
+
+
+def write_annotations(path, strokes):
+    """Write (slide index, hidden, stroke) to a new annotation file at path, replacing it once it's complete."""
+    temp_path = path + '.tmp'
+    with open(temp_path, 'wb') as file:
+        file.write(STORE_MAGIC)
+        for index, hidden, stroke in strokes:
+            file.write(RECORD.pack(STROKE_RECORD, hidden, index, *stroke.color, stroke.width,
+                                   len(stroke.points) // 2))
+            file.write(stroke.points.tobytes())
+    os.replace(temp_path, path)
+
+
+class Annotations(object):
+    """The annotation layers of a deck, keyed by slide index and by whether they were drawn over the blanked
+    screen; only slides that have been drawn on have layers.
+
+    With a path, the annotations are kept in an AnnotationStore there: each slide's strokes are loaded from it when
+    the slide is first shown, and strokes and clears are appended to it as they happen.
+    """
+
+    def __init__(self, path=None):
+        self.layers = {}
+        self.store = AnnotationStore(path) if path is not None else None
+        self._loaded = set()
+        self._drawing = {}  # stroke -> (slide index, hidden) of the strokes not yet finished
+
+    def __contains__(self, index):
+        if self.store is not None and index not in self._loaded and index in self.store:
+            return True
+        return (index, False) in self.layers or (index, True) in self.layers
+
+    def _load(self, index):
+        if self.store is None or index in self._loaded:
+            return
+        self._loaded.add(index)
+        for hidden, color, width, points in self.store.read(index):
+            stroke = Stroke(color, width, points)
+            stroke.finished = True  # already simplified
+            self.layer(index, hidden).add(stroke)
+
+    def get(self, index, hidden):
+        self._load(index)
+        return self.layers.get((index, hidden))
+
+    def layer(self, index, hidden):
+        self._load(index)
+        layer = self.layers.get((index, hidden))
+        if layer is None:
+            layer = self.layers[index, hidden] = AnnotationLayer()
+        return layer
+
+    def slides(self):
+        indices = {index for index, _ in self.layers}
+        if self.store is not None:
+            indices.update(index for index in self.store.slides() if index not in self._loaded)
+        return sorted(indices)
+
+    def begin_stroke(self, index, hidden, stroke):
+        self._drawing[stroke] = index, hidden
+        return self.layer(index, hidden).add(stroke)
+
+    def finish_stroke(self, stroke):
+        stroke.finish()
+        key = self._drawing.pop(stroke, None)
+        if key is not None and self.store is not None and key in self.layers and len(stroke.points) > 0:
+            self.store.append(key[0], key[1], stroke)
+
+    def clear(self, index, hidden):
+        self._load(index)
+        layer = self.layers.pop((index, hidden), None)
+        if layer is not None:
+            layer.hide()
+            if self.store is not None:
+                self.store.append_clear(index, hidden)
+
+    def save(self, path):
+        """Write all the annotations to a new, compact annotation file (e.g. to export them)."""
+        for index in self.slides():
+            self._load(index)
+        replacing_store = self.store is not None and os.path.abspath(path) == os.path.abspath(self.store.path)
+        if replacing_store:
+            self.store.close()
+        write_annotations(path, ((index, hidden, stroke) for (index, hidden), layer in sorted(self.layers.items())
+                                 for stroke in layer.strokes if stroke.finished))
+        if replacing_store:
+            self.store = AnnotationStore(path)
+
+    def close(self):
+        if self.store is not None:
+            self.store.close()
@@ -1,30 +1,95 @@
-from io import BytesIO
+import os
+import time
 
 import kivy
 from PIL import Image
 from gestures4kivy import CommonGestures
-from kivy import Config
+from kivy import Config, Logger
 from kivy.app import App
 from kivy.core.image import Image as CoreImage
 from kivy.core.window import Window
-from kivy.graphics import Color, Line
-from kivy.properties import ObjectProperty, BooleanProperty, NumericProperty
+from kivy.graphics.texture import Texture
+from kivy.properties import ObjectProperty, BooleanProperty, NumericProperty, StringProperty
+from kivy.resources import resource_find
 from kivy.uix.floatlayout import FloatLayout
 from kivy.uix.image import Image as kiImage
 from kivy.uix.relativelayout import RelativeLayout
 from kivy.uix.screenmanager import Screen, ScreenManager, NoTransition, TransitionBase
 from kivy.uix.video import Video
 
+from .annotations import Annotations, Stroke, STROKE_COLOR, STROKE_WIDTH
+from .instrumentation import instruments, InstrumentationOverlay
+from .lazy import LazySlides
+from .prefetch import Prefetcher
+from .slidecache import SlideCache
+from .texturecache import TextureCache, texture_nbytes
+
 kivy.require('2.2.1')
 Config.set('input', 'mouse', 'mouse, disable_multitouch')
 
 
+# PIL modes that can be uploaded to a texture as-is, and the matching kivy colour format
+PIL_COLORFMTS = {
+    'RGB': 'rgb',
+    'RGBA': 'rgba',
+    'L': 'luminance',
+    'LA': 'luminance_alpha',
+}
+
+
+def pil_to_uploadable(canvas_img):
+    """Convert a PIL image to a mode that can be blitted into a texture as-is (CPU only; thread safe)."""
+    if canvas_img.mode not in PIL_COLORFMTS:
+        if 'A' in canvas_img.getbands() or 'transparency' in canvas_img.info:
+            canvas_img = canvas_img.convert('RGBA')
+        else:
+            canvas_img = canvas_img.convert('RGB')
+    return canvas_img
+
+
+def pil_to_texture(canvas_img):
+    """Upload a PIL image directly into a new Texture.
+
+    The raw pixel buffer is blitted straight in, so there is no PNG encode/decode round trip. Images in
+    modes without a matching texture format (palette, 1-bit, CMYK, ...) are converted to RGB(A) first.
+    """
+    canvas_img = pil_to_uploadable(canvas_img)
+    colorfmt = PIL_COLORFMTS[canvas_img.mode]
+    with instruments.timed('texture_upload', detail='%dx%d' % canvas_img.size):
+        texture = Texture.create(size=canvas_img.size, colorfmt=colorfmt)
+        texture.blit_buffer(canvas_img.tobytes(), colorfmt=colorfmt, bufferfmt='ubyte')
+    texture.flip_vertical()  # PIL rows run top-down, GL rows bottom-up
+    return texture
+
+
 def pil_to_kivy(canvas_img):
-    data = BytesIO()
-    canvas_img.save(data, format='png')
-    data.seek(0)
-    im = CoreImage(BytesIO(data.read()), ext='png')
-    return im
+    return CoreImage(pil_to_texture(canvas_img))
+
+
+def widget_to_pil(widget, scale=1.):
+    """Draw a widget (and its children) offscreen into an RGB PIL image, over the window's clear colour."""
+    texture = widget.export_as_image(scale=scale).texture
+    drawn = Image.frombytes('RGBA', texture.size, texture.pixels)  # top row first, as the framebuffer is flipped
+    image = Image.new('RGB', drawn.size, tuple(int(c * 255) for c in Window.clearcolor[:3]))
+    image.paste(drawn, mask=drawn)
+    return image
+
+
+def load_texture(image):
+    if isinstance(image, Image.Image):
+        return pil_to_texture(image)
+    path = resource_find(image) or image
+    try:
+        return pil_to_texture(Image.open(path))
+    except OSError:
+        # fall back to kivy's own loaders for formats and sources (such as atlas://) PIL doesn't know
+        return CoreImage(path).texture
+
+
+texture_cache = TextureCache(load_texture)
+'''Shared by every PictureSlide (and so WrapperSlide backgrounds and the Slideshow background); set
+``texture_cache.max_bytes`` to change its memory budget.
+'''
 
 
 class Slide(Screen):
@@ -32,52 +97,175 @@ class Slide(Screen):
     prev_transition = ObjectProperty(baseclass=TransitionBase)
     ignore_keyboard = BooleanProperty(defaultvalue=False)
 
+    cacheable = BooleanProperty(defaultvalue=True)
+    '''Whether the built widget tree may be kept alive after the slide is left, when the Slideshow retains
+    slides. Slides that hold live resources (cameras, interpreters, ...) should set this to False.
+    '''
+
+    retained = BooleanProperty(defaultvalue=False)
+    '''Set by the Slideshow's SlideCache while the slide's widget tree is being retained.
+    '''
+
+    title = StringProperty('')
+    '''Shown in the Slideshow's overview, and searched by Slideshow.find().
+    '''
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.built = False
+        self.prefetched = False
+
     def build(self):
         pass
 
+    def prefetch_load(self):
+        """Load or decode the slide's assets ahead of time. This runs on the prefetch worker thread, so it must
+        not touch the GL context or the widget tree. Returns the data to hand to prefetch_ready(), or None if
+        there is nothing to prefetch."""
+        return None
+
+    def prefetch_ready(self, data):
+        """Receives the result of prefetch_load() on the main thread. Returns the number of bytes retained."""
+        return 0
+
+    def drop_prefetched(self):
+        pass
+
+    def thumbnail_key(self):
+        """A string that changes whenever what the slide shows changes, so that its thumbnail can be cached on disk;
+        None if it can't be cached."""
+        return None
+
     def close(self):
         pass
 
+    def suspend(self):
+        """Called instead of close() when a retained slide is left."""
+        pass
+
+    def resume(self):
+        """Called instead of build() when a retained slide is entered again."""
+        pass
+
+    def teardown(self):
+        with instruments.timed('close', self, type(self).__name__):
+            self.close()
+        self.clear_widgets()  # remove all children; will rebuild everything with build
+        self.canvas.clear()  # clear any annotations drawn on the canvas
+        self.built = False
+
+    def estimate_texture_bytes(self):
+        total = 0
+        for widget in self.walk(restrict=True):
+            texture = getattr(widget, 'texture', None)
+            if texture is not None:
+                total += texture_nbytes(texture)
+        return total
+
     def on_key_down(self, keyboard, keycode, text, modifiers):
         pass
 
     def on_pre_enter(self):
-        self.build()
+        if self.built:
+            with instruments.timed('resume', self, type(self).__name__):
+                self.resume()
+        else:
+            with instruments.timed('build', self, type(self).__name__):
+                self.build()
+            self.built = True
 
     def on_leave(self, *args):
-        self.close()
-        self.clear_widgets()  # remove all children; will rebuild everything with build
-        self.canvas.clear()  # clear any annotations drawn on the canvas
+        if self.retained:
+            self.suspend()
+        else:
+            self.teardown()
 
 
 class PictureSlide(Slide):
     def __init__(self, image, **kwargs):
         super().__init__(**kwargs)
         self.image = image
+        self._texture = None
+        self._prefetched_texture = None
 
-    def build(self):
+        if not isinstance(self.image, (str, Image.Image)):
+            raise Exception("unsupported type", type(self.image))
+
+    def prefetch_load(self):
+        if self.image in texture_cache:
+            return self.image  # nothing to decode; prefetch_ready just takes a reference
         if isinstance(self.image, str):
-            img = kiImage(source=self.image, fit_mode="contain", pos=(0, 0), pos_hint={'x': 0, 'y': 0})
-        elif isinstance(self.image, Image.Image):
-            img = kiImage(fit_mode="contain", pos=(0, 0), pos_hint={'x': 0, 'y': 0})
-            img.texture = pil_to_kivy(self.image).texture
+            path = resource_find(self.image) or self.image
+            if path.startswith('atlas://'):
+                return self.image  # only kivy can load it, on the main thread
+            img = Image.open(path)
         else:
-            raise Exception("unsupported type", type(self.image))
+            img = self.image
+        img = pil_to_uploadable(img)
+        img.load()
+        return img
+
+    def prefetch_ready(self, data):
+        self.drop_prefetched()
+        self._prefetched_texture = texture_cache.acquire(self.image, decoded=data)
+        self.prefetched = True
+        return texture_nbytes(self._prefetched_texture)
+
+    def drop_prefetched(self):
+        if self._prefetched_texture is not None:
+            texture_cache.release(self._prefetched_texture)
+            self._prefetched_texture = None
+        self.prefetched = False
+
+    def thumbnail_key(self):
+        if not isinstance(self.image, str):
+            return None
+        path = os.path.abspath(resource_find(self.image) or self.image)
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        return 'PictureSlide:%s:%d:%d' % (path, stat.st_mtime_ns, stat.st_size)
 
+    def build(self):
+        try:
+            self._texture = texture_cache.acquire(self.image)
+        except Exception:
+            # as kivy's Image does for a source it can't load, so that one bad path doesn't stop the talk
+            Logger.exception('PictureSlide: Couldn\'t load image %s' % (self.image,))
+        img = kiImage(texture=self._texture, fit_mode="contain", pos=(0, 0), pos_hint={'x': 0, 'y': 0})
         self.add_widget(img)
 
+    def close(self):
+        if self._texture is not None:
+            texture_cache.release(self._texture)
+            self._texture = None
+
 
 class WrapperSlide(Slide):
     def __init__(self, background, slide, **kwargs):
         super().__init__(**kwargs)
 
         self.background = background
+        self.background_slide = PictureSlide(background)
         self.slide = slide
         self.slide.bind(ignore_keyboard=self.setter('ignore_keyboard'))
         self.ignore_keyboard = self.slide.ignore_keyboard
+        self.slide.bind(cacheable=self.setter('cacheable'))
+        self.cacheable = self.slide.cacheable
+        self.slide.bind(title=self.setter('title'))
+        self.title = self.title or self.slide.title
+
+    def thumbnail_key(self):
+        background_key = self.background_slide.thumbnail_key()
+        slide_key = self.slide.thumbnail_key()
+        if background_key is None or slide_key is None:
+            return None
+        return 'WrapperSlide:%s:%s' % (background_key, slide_key)
 
     def build(self):
-        img = PictureSlide(self.background)
+        img = self.background_slide
+        img.parent = None
         img.build()
 
         slide = self.slide
@@ -91,12 +279,38 @@ class WrapperSlide(Slide):
         self.add_widget(layout)
 
     def close(self):
-        self.slide.close()
+        self.background_slide.teardown()
+        self.slide.teardown()
+
+    def prefetch_load(self):
+        return self.background_slide.prefetch_load(), self.slide.prefetch_load()
+
+    def prefetch_ready(self, data):
+        background_data, slide_data = data
+        nbytes = self.background_slide.prefetch_ready(background_data)
+        if slide_data is not None:
+            nbytes += self.slide.prefetch_ready(slide_data)
+        self.prefetched = True
+        return nbytes
+
+    def drop_prefetched(self):
+        self.background_slide.drop_prefetched()
+        self.slide.drop_prefetched()
+        self.prefetched = False
+
+    def suspend(self):
+        self.slide.suspend()
+
+    def resume(self):
+        self.slide.resume()
 
     def on_key_down(self, keyboard, keycode, text, modifiers):
         self.slide.on_key_down(keyboard, keycode, text, modifiers)
 
 
+VIDEO_PREFETCH_BYTES = 32 * 1024 * 1024
+
+
 class AudioVideoSlide(Slide):
     def __init__(self, video, repeat=False, volume=1., **kwargs):
         super().__init__(**kwargs)
@@ -104,6 +318,7 @@ class AudioVideoSlide(Slide):
         self.video = video
         self.repeat = repeat
         self.volume = volume
+        self.player = None
 
     def build(self):
         video = Video(source=self.video, fit_mode='contain', volume=self.volume)
@@ -111,13 +326,33 @@ class AudioVideoSlide(Slide):
             video.options = {'eos': 'loop'}
         video.state = 'play'
         self.add_widget(video)
+        self.player = video
+
+    def prefetch_load(self):
+        # the Video widget can't be given decoded frames, but reading the start of the file warms the OS cache
+        path = resource_find(self.video)
+        if path is not None and os.path.isfile(path):
+            with open(path, 'rb') as file:
+                file.read(VIDEO_PREFETCH_BYTES)
+        return None
+
+    def close(self):
+        self.player = None
+
+    def suspend(self):
+        self.player.state = 'pause'
+
+    def resume(self):
+        self.player.state = 'play'
 
     def on_key_down(self, keyboard, keycode, text, modifiers):
         if keycode[1] == 'spacebar':
-            if self.video.state == 'play':
-                self.video.state = 'pause'
+            if self.player is None:
+                return
+            if self.player.state == 'play':
+                self.player.state = 'pause'
             else:
-                self.video.state = 'play'
+                self.player.state = 'play'
 
 
 class VideoSlide(AudioVideoSlide):
@@ -178,39 +413,77 @@ class ARLayout(RelativeLayout, CommonGestures):
             App.get_running_app().display_prev_slide()
 
     def cgb_drag(self, touch, x, y, delta_x, delta_y):
-        print("drag", self._gesture_state)
-        x, y = App.get_running_app().sm.current_screen.to_widget(touch.x, touch.y)
-        if 'line' not in touch.ud:
-            touch.ud['line'] = Line(points=(x, y), width=2)
-            color = Color(1, 0, 0, 1.0, mode='rgba')
-            App.get_running_app().annotations[App.get_running_app().current_slide_index].append({
-                'line': touch.ud['line'],
-                'hidden': App.get_running_app().hidden,
-                'color': color
-            })
-            App.get_running_app().sm.current_screen.canvas.add(color)
-            App.get_running_app().sm.current_screen.canvas.add(touch.ud['line'])
-        else:
-            touch.ud['line'].points += [x, y]
+        app = App.get_running_app()
+        x, y = app.sm.current_screen.to_widget(touch.x, touch.y)
+        if 'stroke' not in touch.ud:
+            touch.ud['stroke'] = app.begin_stroke()
+        touch.ud['stroke'].add_point(x, y)
+
+    def on_touch_up(self, touch):
+        if 'stroke' in touch.ud:
+            App.get_running_app().end_stroke(touch.ud['stroke'])
+        return super(ARLayout, self).on_touch_up(touch)
+
+
+LAZY_KEEP_SLIDES = 8  # slides either side of the current one that a lazily constructed deck keeps alive
 
 
 class Slideshow(App):
+    __events__ = ('on_slide_switch',)
+
     def __init__(self, slides, slide_width, slide_height, background_image=None,
-                 default_transition: TransitionBase = NoTransition()):
+                 default_transition: TransitionBase = NoTransition(), retain_slides=0, retain_texture_bytes=None,
+                 prefetch=0, prefetch_bytes=256 * 1024 * 1024, num_slides=None, annotations_file=None,
+                 titles=None, thumbnail_dir=None, trace_file=None):
+        """
+        :param slides: a list (or other sequence) of slides, or a factory taking a slide index and returning the
+                       Slide, in which case num_slides must be given and slides are only built when first needed
+        :param retain_slides: number of recently visited slides whose built widgets are kept alive, so that
+                              revisiting them does not re-run build(); 0 disables retention
+        :param retain_texture_bytes: optional cap on the estimated texture memory of the retained slides
+        :param prefetch: number of slides either side of the current one whose assets are loaded in the
+                         background; 0 disables prefetching
+        :param prefetch_bytes: cap on the memory held by prefetched assets
+        :param num_slides: the number of slides, when slides is a factory
+        :param annotations_file: file to keep the annotations in, so that they are there the next time the deck is
+                                 shown; created if it doesn't exist
+        :param titles: the slides' titles, or a function from slide index to title, for find() and the overview;
+                       by default the slides' title properties (which for a factory means constructing every slide)
+        :param thumbnail_dir: directory to cache the overview's thumbnails in, for slides that allow it
+        :param trace_file: file to write the instrumentation's events to when the slideshow stops, as CSV if it
+                           ends with .csv and otherwise as JSON; frame times are then sampled throughout
+        """
         super().__init__()
 
         self.hidden = False
+        if callable(slides):
+            if num_slides is None:
+                raise ValueError("num_slides must be given when slides is a factory")
+            slides = LazySlides(slides, num_slides, keep=max(LAZY_KEEP_SLIDES, prefetch))
         self.slides = slides
-        self.annotations = [[] for _ in slides]
+        self.annotations = Annotations(annotations_file)
+        self._titles = titles
+        self._slide_index = None
+        self.thumbnail_dir = thumbnail_dir
+        self.thumbnails = None
+        self.overview = None
+        self._typed_number = ''
+        self.trace_file = trace_file
+        self.instrumentation_overlay = None
+        if trace_file is not None:
+            instruments.watch_frames()
         self.current_slide_index = -1
         self.current_slide = None
         self.default_transition = default_transition
+        self.slide_cache = SlideCache(retain_slides, retain_texture_bytes)
+        self.prefetcher = Prefetcher(slides, prefetch, prefetch_bytes) if prefetch > 0 else None
 
         self.root = ARLayout(
             ratio=float(slide_height) / float(slide_width))  # root layout has fixed aspect ratio within window
 
         layout = FloatLayout()  # FloatLayout to allow overlapping bg
         self.root.add_widget(layout)
+        self.layout = layout
 
         if background_image is not None:
             bg = PictureSlide(background_image, pos_hint={'x': 0, 'y': 0})
@@ -229,10 +502,25 @@ class Slideshow(App):
         pass
 
     def on_key_down(self, keyboard, keycode, text, modifiers):
+        if self.overview is not None:
+            if keycode[1] == 'escape' or (keycode[1] == 'o' and not self.overview.searching):
+                self.toggle_overview()
+            return True
+
         if self.current_slide.ignore_keyboard:
             return True
 
-        if keycode[1] == 'left' or keycode[1] == 'pageup' or keycode[1] == 'up':
+        typed_number, self._typed_number = self._typed_number, ''
+        if text and text.isdigit() and 'ctrl' not in modifiers and 'alt' not in modifiers:
+            # typing a slide number and pressing enter goes to that slide
+            self._typed_number = typed_number + text
+        elif keycode[1] in ('enter', 'numpadenter') and typed_number:
+            self.goto(int(typed_number) - 1)
+        elif keycode[1] == 'o':
+            self.toggle_overview()
+        elif keycode[1] == 'i':
+            self.toggle_instrumentation_overlay()
+        elif keycode[1] == 'left' or keycode[1] == 'pageup' or keycode[1] == 'up':
             if not self.hidden:
                 self.display_prev_slide()
         elif keycode[1] == 'right' or keycode[1] == 'pagedown' or keycode[1] == 'down':
@@ -253,51 +541,146 @@ class Slideshow(App):
 
         return True
 
+    def begin_stroke(self, color=STROKE_COLOR, width=STROKE_WIDTH):
+        """Start a stroke on the current slide (or on the blanked screen); add its points with add_point() and
+        pass it to end_stroke() when it's done."""
+        index = self.current_slide_index
+        self.annotations.layer(index, self.hidden).show(self.sm.current_screen.canvas)
+        return self.annotations.begin_stroke(index, self.hidden, Stroke(color, width))
+
+    def end_stroke(self, stroke):
+        self.annotations.finish_stroke(stroke)
+
     def clear_annotations(self):
-        filtered = []
-        for anno in self.annotations[self.current_slide_index]:
-            if anno['hidden'] != self.hidden:
-                filtered.append(anno)
-            else:
-                self.sm.current_screen.canvas.remove(anno['color'])
-                self.sm.current_screen.canvas.remove(anno['line'])
-        self.annotations[self.current_slide_index] = filtered
+        self.annotations.clear(self.current_slide_index, self.hidden)
+
+    def undraw_annotations(self):
+        # retained slides keep their canvas when left, so the annotations must be taken off explicitly
+        layer = self.annotations.get(self.current_slide_index, self.hidden)
+        if layer is not None:
+            layer.hide()
 
     def draw_annotations(self):
-        for anno in self.annotations[self.current_slide_index]:
-            if self.hidden == anno['hidden']:
-                self.sm.current_screen.canvas.add(anno['color'])
-                self.sm.current_screen.canvas.add(anno['line'])
+        with instruments.timed('annotations'):
+            layer = self.annotations.get(self.current_slide_index, self.hidden)
+            if layer is not None:
+                layer.show(self.sm.current_screen.canvas)
 
     def display_next_slide(self):
         if self.hidden:
             return
 
         if self.current_slide_index < len(self.slides) - 1:
-            self.current_slide_index += 1
-            next_slide = self.slides[self.current_slide_index]
             if self.current_slide is None or self.current_slide.next_transition is None:
-                self.sm.switch_to(next_slide, transition=self.default_transition, direction='left')
+                self.switch_slide(self.current_slide_index + 1, transition=self.default_transition, direction='left')
             else:
-                self.sm.switch_to(next_slide, transition=self.current_slide.next_transition)
-            self.current_slide = next_slide
-            self.draw_annotations()
+                self.switch_slide(self.current_slide_index + 1, transition=self.current_slide.next_transition)
 
     def display_prev_slide(self):
         if self.hidden:
             return
 
         if self.current_slide_index > 0:
-            self.current_slide_index -= 1
-            next_slide = self.slides[self.current_slide_index]
             if self.current_slide is None or self.current_slide.prev_transition is None:
-                self.sm.switch_to(next_slide, transition=self.default_transition, direction='right')
+                self.switch_slide(self.current_slide_index - 1, transition=self.default_transition, direction='right')
             else:
-                self.sm.switch_to(next_slide, transition=self.current_slide.prev_transition)
-            self.current_slide = next_slide
-            self.draw_annotations()
+                self.switch_slide(self.current_slide_index - 1, transition=self.current_slide.prev_transition)
+
+    def goto(self, index):
+        """Show the slide at index (counting from 0), building only that slide."""
+        if self.hidden or not 0 <= index < len(self.slides) or index == self.current_slide_index:
+            return
+        direction = 'left' if index > self.current_slide_index else 'right'
+        self.switch_slide(index, transition=self.default_transition, direction=direction)
+
+    @property
+    def titles(self):
+        """The SlideIndex of the slides' titles, made when first needed."""
+        if self._slide_index is None:
+            from .navigation import SlideIndex
+            self._slide_index = SlideIndex(self.slides, self._titles)
+            if isinstance(self.slides, LazySlides):
+                self.slides.trim(self.current_slide_index)
+        return self._slide_index
+
+    def find(self, query):
+        """Indices of the slides whose titles contain query, ignoring case."""
+        return self.titles.find(query)
+
+    def toggle_overview(self):
+        """Show or hide a searchable grid of thumbnails of the slides, over the current one."""
+        if self.overview is not None:
+            self.layout.remove_widget(self.overview)
+            self.overview = None
+            self.thumbnails.stop()
+            return
+        if self.hidden:
+            return
+
+        from .navigation import SlideOverview, Thumbnails
+        if self.thumbnails is None:
+            self.thumbnails = Thumbnails(self, cache_dir=self.thumbnail_dir)
+        self.overview = SlideOverview(self, self.thumbnails, pos_hint={'x': 0, 'y': 0})
+        self.layout.add_widget(self.overview)
+        self.overview.scroll_to(self.current_slide_index)
+
+    def toggle_instrumentation_overlay(self):
+        """Show or hide the frame rate and the timings of the last slide switch over the slides."""
+        if self.instrumentation_overlay is None:
+            self.instrumentation_overlay = InstrumentationOverlay(pos_hint={'x': 0.01, 'top': 0.99})
+            self.layout.add_widget(self.instrumentation_overlay)
+        else:
+            self.layout.remove_widget(self.instrumentation_overlay)
+            self.instrumentation_overlay = None
+
+    def switch_slide(self, index, **options):
+        start = time.perf_counter()
+
+        if self.current_slide is not None:
+            self.undraw_annotations()
+        self.current_slide_index = index
+        next_slide = self.slides[index]
+        instruments.slide = index
+        instruments.set_slide_index(next_slide, index)
+        prefetch_hit = next_slide.prefetched
+        self.sm.switch_to(next_slide, **options)
+        self.current_slide = next_slide
+        self.slide_cache.touch(next_slide)
+        self.draw_annotations()
+
+        if self.prefetcher is not None:
+            self.prefetcher.update(index)
+        if isinstance(self.slides, LazySlides):
+            self.slides.trim(index)
+
+        duration = time.perf_counter() - start
+        instruments.record('switch', duration, start, index, 'prefetched' if prefetch_hit else None)
+        transition = self.sm.transition
+        if transition.is_active:
+            def on_complete(*args):
+                transition.unbind(on_complete=on_complete)
+                instruments.record('transition', time.perf_counter() - start, start, index)
+            transition.bind(on_complete=on_complete)
+
+        self.dispatch('on_slide_switch', index, duration, prefetch_hit)
+
+    def on_slide_switch(self, index, duration, prefetch_hit):
+        """Timing hook, dispatched after every slide switch with the time the switch took (in seconds) and
+        whether the new slide's assets had already been prefetched."""
+        pass
+
+    def on_stop(self):
+        if self.prefetcher is not None:
+            self.prefetcher.stop()
+        if self.thumbnails is not None:
+            self.thumbnails.stop()
+        if self.trace_file is not None:
+            instruments.watch_frames(False)
+            instruments.export(self.trace_file)
+        self.annotations.close()
 
     def toggle_hidden(self):
+        self.undraw_annotations()
         if self.hidden:
             self.sm.switch_to(self.current_slide, transition=NoTransition())
         else:
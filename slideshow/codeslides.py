@@ -1,6 +1,12 @@
+import io
+import threading
+import traceback
 from abc import abstractmethod
+from functools import partial
 
-from kivy.properties import ListProperty, StringProperty, NumericProperty
+from kivy import Logger
+from kivy.clock import Clock
+from kivy.properties import ListProperty, StringProperty, NumericProperty, BooleanProperty
 from kivy.resources import resource_find
 from kivy.uix.boxlayout import BoxLayout
 from kivy.uix.codeinput import CodeInput
@@ -8,8 +14,12 @@ from kivy.uix.splitter import Splitter
 from pygments.lexers import PythonLexer
 
 from . import Slide
+from .shells import sandbox as sandbox_processes
+from .shells.cells import Cell, cells_to_run, compile_source, source_hash, split_cells
+from .shells.interpreters import capture_output
 from .shells.python_shell import PythonREPLWidget
 from .shells.simple_cmd_shell import ShellConsole
+from .shells.terminal import TerminalConsole
 
 
 class __AbstractShellSlide(Slide):
@@ -17,6 +27,7 @@ class __AbstractShellSlide(Slide):
     background_color = ListProperty((1, 1, 1, 1))
     font_name = StringProperty('RobotoMono-regular')
     font_size = NumericProperty("14sp")
+    cacheable = BooleanProperty(defaultvalue=False)
 
     def __init__(self, **kw):
         super().__init__(**kw)
@@ -51,19 +62,114 @@ class __AbstractShellSlide(Slide):
         pass
 
 
-class PythonREPLSlide(__AbstractShellSlide):
+class SandboxOptions(object):
+    '''Mixin for the REPL slides' sandbox settings
+    '''
+
+    sandbox = BooleanProperty(False)
+    '''Run the code in a child process with limits on CPU time and memory (see shells.sandbox.Sandbox), so that
+    runaway code can't take the slideshow down. POSIX only
+    '''
+
+    cpu_limit = NumericProperty(sandbox_processes.CPU_LIMIT)
+    '''Seconds of CPU time each command may use in the sandbox
+    '''
+
+    memory_limit = NumericProperty(sandbox_processes.MEMORY_LIMIT)
+    '''Bytes of memory the sandbox may use
+    '''
+
+    timeout = NumericProperty(None, allownone=True)
+    '''Seconds after which a command in the sandbox is interrupted, and if need be the sandbox restarted
+    '''
+
+    def prestart_sandbox(self):
+        if self.sandbox:
+            sandbox_processes.prestart(self.memory_limit)  # so that the slide doesn't wait for a process to start
+
+    def take_sandbox(self):
+        if not self.sandbox:
+            return None
+        return sandbox_processes.take(self.cpu_limit, self.memory_limit, self.timeout)
+
+
+class PythonREPLSlide(SandboxOptions, __AbstractShellSlide):
+    def __init__(self, **kw):
+        super().__init__(**kw)
+        self.repl = None
+        self.prestart_sandbox()
+
     def get_shell(self):
-        ci = PythonREPLWidget(size_hint=(0.9, 0.9))
+        ci = PythonREPLWidget(size_hint=(0.9, 0.9), sandbox=self.take_sandbox())
+        self.repl = ci
         return ci, [ci.text_input]
 
+    def close(self):
+        if self.repl is not None:
+            self.repl.close()
+            self.repl = None
+
 
 class TerminalSlide(__AbstractShellSlide):
+    persistent = BooleanProperty(False)
+    '''Run commands in one shell process that lives as long as the slide is built (see ShellConsole.persistent)
+    '''
+
+    shell_command = ListProperty(['/bin/sh', '+m'])
+    '''The shell used when persistent
+    '''
+
+    virtualized = BooleanProperty(False)
+    '''Draw the console as a fixed-size terminal screen (see TerminalConsole), so that long outputs stay fast to
+    show and scroll, rather than as a TextInput
+    '''
+
+    def __init__(self, **kw):
+        super().__init__(**kw)
+        self.console = None
+
     def get_shell(self):
-        ci = ShellConsole(size_hint=(0.9, 0.9))
-        return ci, [ci.console_input]
+        console_class = TerminalConsole if self.virtualized else ShellConsole
+        ci = console_class(size_hint=(0.9, 0.9), persistent=self.persistent, shell_command=self.shell_command)
+        self.console = ci
+        if self.persistent:
+            try:
+                ci.open_session()  # start the shell now, rather than on the first command
+            except Exception:
+                Logger.exception('TerminalSlide: Couldn\'t start the shell')
+        return ci, [ci if self.virtualized else ci.console_input]
+
+    def close(self):
+        if self.console is not None:
+            self.console.close_session()
+            self.console = None
 
 
-class PythonCodeREPLSlide(Slide):
+class PythonCodeREPLSlide(SandboxOptions, Slide):
+    cacheable = BooleanProperty(defaultvalue=False)
+
+    cell_mode = BooleanProperty(False)
+    '''Split the code into cells at lines starting with "# %%", and only re-run the cells that have changed and
+    the cells after them that use the names those bind
+    '''
+
+    live = BooleanProperty(False)
+    '''Re-run the code as it is edited, once no key has been pressed for live_delay seconds, rather than only
+    when the editor loses focus
+    '''
+
+    live_delay = NumericProperty(0.5)
+
+    reset_on_enter = BooleanProperty(False)
+    '''Start from a fresh namespace, and run the initial script again, every time the slide is entered. By default
+    the namespace, and the code last run, are kept when the slide is left
+    '''
+
+    warm_up = BooleanProperty(False)
+    '''Run the initial script in the background when the slide is prefetched (see Slideshow(prefetch=...)), so
+    that slow imports and set-up are done before the slide is reached
+    '''
+
     def __init__(self, initial_script="", initial_script_file=None, initial_commands=None, **kwargs):
         super().__init__(**kwargs)
 
@@ -71,8 +177,18 @@ class PythonCodeREPLSlide(Slide):
             initial_commands = []
 
         self.shell = None
+        self.repl = None
+        self.code_input = None
+        self.namespace = {'__name__': '__console__', '__doc__': None}
+        self._source = None  # the code that has been run in namespace
+        self._source_hash = None
+        self._cell_hashes = []
+        self._state_lock = threading.Lock()  # guards the above, which the warm-up sets from the prefetch thread
+        self._exec_lock = threading.Lock()  # held while code runs in namespace
+        self._warm_up_output = ''
         self.initial_script = initial_script
         self.initial_commands = initial_commands
+        self.prestart_sandbox()
 
         if initial_script_file:
             with open(resource_find(initial_script_file), 'r') as file:
@@ -85,15 +201,28 @@ class PythonCodeREPLSlide(Slide):
         ci = CodeInput(lexer=PythonLexer())
         ci.bind(focus=self.text_area_on_focus)
         ci.bind(focus=self.rerun_code)
+        ci.bind(text=self._on_code_changed)
+        self.code_input = ci
+        self._live_trigger = Clock.create_trigger(self._run_live, self.live_delay)
 
         splitter.add_widget(ci)
         layout.add_widget(splitter)
 
-        repl = PythonREPLWidget(banner=False, history=self.initial_commands)
+        if self.reset_on_enter:
+            self.reset()
+
+        repl = PythonREPLWidget(banner=False, history=self.initial_commands, namespace=self.namespace,
+                                sandbox=self.take_sandbox())
+        self.repl = repl
         self.shell = repl.sh
-        if len(self.initial_script.strip()) > 0:
-            self.shell.runcode(self.initial_script)
+        repl.submit(partial(self._show_warm_up_output, self.shell))
+        with self._state_lock:
+            source = self._source
+        if source is not None:
+            ci.text = source  # already run, by an earlier visit or the warm-up
+        elif len(self.initial_script.strip()) > 0:
             ci.text = self.initial_script
+            self.run_code(self.initial_script)
 
         repl.text_input.bind(focus=self.text_area_on_focus)
         layout.add_widget(repl)
@@ -102,7 +231,96 @@ class PythonCodeREPLSlide(Slide):
 
     def rerun_code(self, instance, value, *args):
         if value is False:
-            self.shell.runcode(instance.text)
+            self.run_code(instance.text)
+
+    def run_code(self, source):
+        """Run source on the interpreter thread, unless it is the code that was run last."""
+        digest = source_hash(source)
+        with self._state_lock:
+            if digest == self._source_hash:
+                return
+            self._source = source
+            self._source_hash = digest
+
+            if not self.cell_mode:
+                self._cell_hashes = []
+                self.repl.submit(partial(self._run_cells, self.shell, [Cell(source, 0, 1)]))
+                return
+
+            cells = split_cells(source)
+            run = cells_to_run(cells, self._cell_hashes)
+            self._cell_hashes = [cell.hash for cell in cells]
+        self.repl.submit(partial(self._run_cells, self.shell, run))
+
+    def reset(self):
+        """Forget the namespace and the code that has been run; the initial script runs again when the slide
+        is next built."""
+        with self._state_lock:
+            self.namespace = {'__name__': '__console__', '__doc__': None}  # code still running keeps the old one
+            self._source = None
+            self._source_hash = None
+            self._cell_hashes = []
+            self._warm_up_output = ''
+
+    def _run_cells(self, shell, cells):
+        # on the interpreter thread; given the shell, as close() on the main thread may clear self.shell meanwhile
+        with self._exec_lock:
+            for cell in cells:
+                try:
+                    code = cell.compile()
+                except (OverflowError, SyntaxError, ValueError):
+                    shell.showsyntaxerror()
+                    continue
+                shell.runcode(code)
+
+    def _show_warm_up_output(self, shell):
+        # on the interpreter thread; waits for a warm-up that is still running
+        with self._exec_lock:
+            output, self._warm_up_output = self._warm_up_output, ''
+        if output:
+            shell.write(output)
+
+    def prefetch_load(self):
+        if not self.warm_up or self.sandbox or len(self.initial_script.strip()) == 0:
+            return None
+
+        source = self.initial_script
+        with self._exec_lock:
+            with self._state_lock:
+                if self._source_hash is not None:
+                    return None  # already run
+                self._source = source
+                self._source_hash = source_hash(source)
+                self._cell_hashes = [cell.hash for cell in split_cells(source)] if self.cell_mode else []
+
+            output = io.StringIO()
+            with capture_output(output.write):
+                try:
+                    exec(compile_source(source), self.namespace)
+                except Exception:
+                    traceback.print_exc(file=output)
+            self._warm_up_output += output.getvalue()
+        return None
+
+    def _on_code_changed(self, instance, value):
+        if self.live:
+            self._live_trigger.timeout = self.live_delay
+            self._live_trigger()
+
+    def _run_live(self, *args):
+        if self.code_input is not None:
+            self.run_code(self.code_input.text)
+
+    def close(self):
+        if self.code_input is not None:
+            self._live_trigger.cancel()
+            self.code_input = None
+        if self.repl is not None:
+            self.repl.close()
+            self.repl = None
+            self.shell = None
+            if self.sandbox:
+                self.reset()  # the namespace was in the sandbox process
 
     def text_area_on_focus(self, instance, value, *args):
         self.ignore_keyboard = value
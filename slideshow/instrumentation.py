@@ -0,0 +1,201 @@
+import contextlib
+import csv
+import json
+import threading
+import time
+import weakref
+from collections import deque
+
+from kivy.clock import Clock
+from kivy.properties import NumericProperty
+from kivy.uix.label import Label
+
+RING_SIZE = 4096  # events kept
+SAMPLE_WINDOW = 240  # recent samples of frequent things (frames, camera updates) kept for their statistics
+SLOW_SAMPLE = 1 / 30.  # samples taking longer than this (in seconds) are also kept as events
+OVERLAY_INTERVAL = 0.25  # seconds between updates of the overlay
+OVERLAY_KINDS = ('switch', 'build', 'resume', 'transition', 'annotations', 'close', 'texture_upload')
+FIELDS = ('time', 'kind', 'slide', 'duration', 'detail')
+
+
+class Instrumentation(object):
+    """Timings of what the slideshow does, to find out why a slide switch or a frame was slow.
+
+    Events (a slide's build, close, switch, transition, annotation drawing, texture uploads, camera stalls, slow
+    frames...) go into a ring buffer as (time, kind, slide index, duration, detail), times in seconds since the
+    instrumentation was created. Frequent things, like frames and camera updates, are sampled instead: only the
+    last few are kept, for their statistics, and only slow ones become events.
+    """
+
+    def __init__(self, size=RING_SIZE):
+        self.enabled = True
+        self.events = deque(maxlen=size)
+        self.samples = {}  # kind -> deque of recent durations
+        self.slide = None  # index of the slide on screen, for events that don't give one
+        self._slide_indices = weakref.WeakKeyDictionary()  # slide -> index, for events about slides
+        self._origin = time.perf_counter()
+        self._lock = threading.Lock()
+        self._frame_watchers = 0
+        self._frame_event = None
+
+    def slide_index(self, slide):
+        return self._slide_indices.get(slide)
+
+    def set_slide_index(self, slide, index):
+        self._slide_indices[slide] = index
+
+    def record(self, kind, duration, start=None, slide=None, detail=None):
+        """Record an event; slide is a slide index or a Slide, by default the slide on screen."""
+        if not self.enabled:
+            return
+        if start is None:
+            start = time.perf_counter() - duration
+        if slide is None:
+            slide = self.slide
+        elif not isinstance(slide, int):
+            slide = self._slide_indices.get(slide)
+        with self._lock:
+            self.events.append((start - self._origin, kind, slide, duration, detail))
+
+    @contextlib.contextmanager
+    def timed(self, kind, slide=None, detail=None):
+        if not self.enabled:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(kind, time.perf_counter() - start, start, slide, detail)
+
+    def sample(self, kind, duration, detail=None):
+        if not self.enabled:
+            return
+        with self._lock:
+            samples = self.samples.get(kind)
+            if samples is None:
+                samples = self.samples[kind] = deque(maxlen=SAMPLE_WINDOW)
+            samples.append(duration)
+        if duration > SLOW_SAMPLE:
+            self.record(kind, duration, detail=detail)
+
+    def sample_stats(self, kind):
+        """(mean, worst) of the recent samples of kind, or None if there are none."""
+        with self._lock:
+            samples = list(self.samples.get(kind, ()))
+        if not samples:
+            return None
+        return sum(samples) / len(samples), max(samples)
+
+    def last(self, kind, slide=None):
+        """The most recent event of kind (about slide, if given), or None."""
+        with self._lock:
+            for event in reversed(self.events):
+                if event[1] == kind and (slide is None or event[2] == slide):
+                    return event
+        return None
+
+    def snapshot(self):
+        with self._lock:
+            return list(self.events)
+
+    def clear(self):
+        with self._lock:
+            self.events.clear()
+            self.samples.clear()
+
+    def watch_frames(self, watch=True):
+        """Start (or, with watch=False, stop) sampling frame times; calls are counted, so that several users can
+        each start and stop watching."""
+        self._frame_watchers += 1 if watch else -1
+        if self._frame_watchers > 0 and self._frame_event is None:
+            self._frame_event = Clock.schedule_interval(self._on_frame, 0)
+        elif self._frame_watchers <= 0 and self._frame_event is not None:
+            self._frame_event.cancel()
+            self._frame_event = None
+            self._frame_watchers = 0
+
+    def _on_frame(self, dt):
+        self.sample('frame', dt)
+
+    def export_json(self, path):
+        with open(path, 'w') as file:
+            json.dump({
+                'events': [dict(zip(FIELDS, event)) for event in self.snapshot()],
+                'samples': {kind: dict(zip(('mean', 'worst'), self.sample_stats(kind))) for kind in list(self.samples)}
+            }, file, indent=1)
+
+    def export_csv(self, path):
+        with open(path, 'w', newline='') as file:
+            writer = csv.writer(file)
+            writer.writerow(FIELDS)
+            writer.writerows(self.snapshot())
+
+    def export(self, path):
+        """Write the events to path, as CSV if it ends with .csv and as JSON otherwise."""
+        if path.lower().endswith('.csv'):
+            self.export_csv(path)
+        else:
+            self.export_json(path)
+
+
+instruments = Instrumentation()
+'''The Instrumentation that the slideshow, its slides and cameras record into.
+'''
+
+
+def _ms(seconds):
+    return '%.1f ms' % (seconds * 1000)
+
+
+class InstrumentationOverlay(Label):
+    """Text over the slides with the frame rate and the timings of the last slide switch, updated a few times a
+    second while it is shown."""
+
+    interval = NumericProperty(OVERLAY_INTERVAL)
+
+    def __init__(self, instrumentation=None, **kwargs):
+        kwargs.setdefault('size_hint', (None, None))
+        kwargs.setdefault('halign', 'left')
+        kwargs.setdefault('valign', 'top')
+        kwargs.setdefault('color', (1, 1, 0, 1))
+        kwargs.setdefault('outline_width', 1)
+        kwargs.setdefault('outline_color', (0, 0, 0, 1))
+        super(InstrumentationOverlay, self).__init__(**kwargs)
+        self.instrumentation = instrumentation or instruments
+        self.bind(texture_size=self.setter('size'))
+        self._event = None
+
+    def on_parent(self, widget, parent):
+        if parent is not None and self._event is None:
+            self.instrumentation.watch_frames()
+            self._event = Clock.schedule_interval(self.update, self.interval)
+            self.update()
+        elif parent is None and self._event is not None:
+            self._event.cancel()
+            self._event = None
+            self.instrumentation.watch_frames(False)
+
+    def update(self, *args):
+        instrumentation = self.instrumentation
+        lines = []
+        frames = instrumentation.sample_stats('frame')
+        if frames is not None:
+            lines.append('%.1f fps, worst frame %s' % (1 / frames[0] if frames[0] > 0 else 0, _ms(frames[1])))
+
+        slide = instrumentation.slide
+        lines.append('slide %s' % ('-' if slide is None else slide + 1))
+        for kind in OVERLAY_KINDS:
+            event = instrumentation.last(kind, None if kind in ('close', 'texture_upload') else slide)
+            if event is not None:
+                where = '' if event[2] in (None, slide) else ' (slide %d)' % (event[2] + 1)
+                detail = '' if event[4] is None else ' %s' % event[4]
+                lines.append('  %s %s%s%s' % (kind, _ms(event[3]), detail, where))
+
+        camera = instrumentation.sample_stats('camera_update')
+        if camera is not None:
+            lines.append('camera update %s, worst %s' % (_ms(camera[0]), _ms(camera[1])))
+            stall = instrumentation.last('camera_stall')
+            if stall is not None:
+                lines.append('  last stall %s at %.1f s' % (_ms(stall[3]), stall[0]))
+        self.text = '\n'.join(lines)
@@ -0,0 +1,47 @@
+from collections.abc import Sequence
+
+
+class LazySlides(Sequence):
+    """A deck of ``length`` slides that are only constructed, by ``factory(index)``, when first accessed.
+
+    Slides further than ``keep`` places from the current one can be dropped again with trim(), so that the
+    number of live slide objects stays bounded however large the deck is.
+    """
+
+    def __init__(self, factory, length, keep=8):
+        self.factory = factory
+        self.length = length
+        self.keep = keep
+        self._slides = {}
+
+    def __len__(self):
+        return self.length
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(self.length))]
+
+        if index < 0:
+            index += self.length
+        if not 0 <= index < self.length:
+            raise IndexError('slide index out of range')
+
+        slide = self._slides.get(index)
+        if slide is None:
+            slide = self.factory(index)
+            self._slides[index] = slide
+        return slide
+
+    def is_loaded(self, index):
+        return index in self._slides
+
+    @property
+    def loaded(self):
+        return len(self._slides)
+
+    def trim(self, center):
+        """Drop the slides further than keep from center that aren't built, retained or prefetched."""
+        for index in [i for i in self._slides if abs(i - center) > self.keep]:
+            slide = self._slides[index]
+            if not (slide.built or slide.retained or slide.prefetched):
+                del self._slides[index]
@@ -0,0 +1,289 @@
+import hashlib
+import math
+import os
+import time
+from collections import OrderedDict
+
+from PIL import Image
+from kivy.clock import Clock
+from kivy.lang import Builder
+from kivy.properties import BooleanProperty, NumericProperty, ObjectProperty, StringProperty
+from kivy.uix.behaviors import ButtonBehavior
+from kivy.uix.boxlayout import BoxLayout
+from kivy.uix.recycleview.views import RecycleDataViewBehavior
+
+from .base import pil_to_texture, widget_to_pil
+
+THUMBNAIL_WIDTH = 256
+MAX_THUMBNAILS = 256  # thumbnail textures kept in memory
+MAX_THUMBNAIL_REQUESTS = 64  # the most recent requests are served first, and the oldest dropped
+STEP_TIME = 0.008  # seconds per frame spent loading cached thumbnails
+RENDER_FRAMES = 2  # frames between building a slide for its thumbnail and drawing it, for its layout to be done
+OVERVIEW_COLUMNS = 5
+
+
+class SlideIndex(object):
+    """The titles of a deck's slides, for finding slides by name.
+
+    :param titles: the titles, or a function from slide index to title; by default the slides' own titles, which
+                   for a lazily constructed deck means constructing every slide
+    """
+
+    def __init__(self, slides, titles=None):
+        if titles is None:
+            titles = [slides[i].title for i in range(len(slides))]
+        elif callable(titles):
+            titles = [titles(i) for i in range(len(slides))]
+        self.titles = list(titles)
+        self._folded = [title.casefold() for title in self.titles]
+
+    def __len__(self):
+        return len(self.titles)
+
+    def find(self, query):
+        """Indices of the slides whose titles contain query, ignoring case; those starting with it come first."""
+        query = query.strip().casefold()
+        if not query:
+            return list(range(len(self.titles)))
+        starting = [i for i, title in enumerate(self._folded) if title.startswith(query)]
+        containing = [i for i, title in enumerate(self._folded) if query in title and not title.startswith(query)]
+        return starting + containing
+
+
+class Thumbnails(object):
+    """Low resolution images of a Slideshow's slides, made when first asked for.
+
+    A slide that isn't on screen is built offscreen, drawn a couple of frames later and torn down again, one slide
+    at a time so that the slideshow stays responsive. The most recently used thumbnails are kept in memory, and
+    those of slides with a thumbnail_key() are also cached as PNG files in cache_dir, so that they are only made
+    once. Slides that aren't cacheable (cameras, interpreters, ...) aren't built for a thumbnail.
+    """
+
+    def __init__(self, slideshow, width=THUMBNAIL_WIDTH, cache_dir=None):
+        self.slideshow = slideshow
+        self.width = width
+        self.cache_dir = cache_dir
+        self._textures = OrderedDict()  # slide index -> texture, or None if the slide has no thumbnail
+        self._requests = OrderedDict()  # slide index -> callbacks
+        self._building = None  # [index, slide, frames to wait] of the slide being built offscreen
+        self._event = None
+        if cache_dir is not None:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    @property
+    def size(self):
+        return self.width, max(int(round(self.width * self.slideshow.root.ratio)), 1)
+
+    def request(self, index, callback):
+        """Call callback(index, texture) with the thumbnail of a slide (texture is None if it has none), now if it
+        is already made, otherwise once it is."""
+        if index in self._textures:
+            self._textures.move_to_end(index)
+            callback(index, self._textures[index])
+            return
+
+        self._requests.setdefault(index, []).append(callback)
+        self._requests.move_to_end(index)
+        while len(self._requests) > MAX_THUMBNAIL_REQUESTS:
+            self._requests.popitem(last=False)
+        if self._event is None:
+            self._event = Clock.schedule_interval(self._step, 0)
+
+    def cancel(self, callback):
+        for index, callbacks in list(self._requests.items()):
+            if callback in callbacks:
+                callbacks.remove(callback)
+                if not callbacks:
+                    del self._requests[index]
+
+    def discard(self, index):
+        """Forget the thumbnail of a slide whose content has changed."""
+        self._textures.pop(index, None)
+
+    def _cache_path(self, slide):
+        if self.cache_dir is None:
+            return None
+        key = slide.thumbnail_key()
+        if key is None:
+            return None
+        digest = hashlib.sha1(('%s:%dx%d' % ((key,) + self.size)).encode('utf8')).hexdigest()
+        return os.path.join(self.cache_dir, digest + '.png')
+
+    def _step(self, dt):
+        if self._building is not None:
+            self._building[2] -= 1
+            if self._building[2] <= 0:
+                index, slide, _ = self._building
+                self._building = None
+                self._finish(index, self._draw(slide))
+                if slide.manager is None and not slide.retained:  # it may have been shown in the meantime
+                    slide.teardown()
+            return
+
+        deadline = time.perf_counter() + STEP_TIME
+        while self._building is None and time.perf_counter() < deadline:
+            if not self._requests:
+                self._event = None
+                return False
+
+            index = next(reversed(self._requests))  # the most recent; its callbacks are called by _finish()
+            slide = self.slideshow.slides[index]
+
+            cache_path = self._cache_path(slide)
+            if cache_path is not None and os.path.exists(cache_path):
+                with Image.open(cache_path) as image:
+                    self._finish(index, pil_to_texture(image))
+            elif slide.built:
+                self._finish(index, self._draw(slide))
+            elif not slide.cacheable:
+                self._finish(index, None)
+            else:
+                slide.size = self.slideshow.sm.size
+                slide.pos = 0, 0
+                slide.build()
+                slide.built = True
+                self._building = [index, slide, RENDER_FRAMES]
+
+    def _draw(self, slide):
+        image = widget_to_pil(slide, scale=self.width / max(slide.width, 1))
+        if image.size != self.size:
+            image = image.resize(self.size)
+        cache_path = self._cache_path(slide)
+        if cache_path is not None:
+            image.save(cache_path)
+        return pil_to_texture(image)
+
+    def _finish(self, index, texture):
+        self._textures[index] = texture
+        while len(self._textures) > MAX_THUMBNAILS:
+            self._textures.popitem(last=False)
+        for callback in self._requests.pop(index, []):
+            callback(index, texture)
+
+    def stop(self):
+        if self._event is not None:
+            self._event.cancel()
+            self._event = None
+        self._requests.clear()
+        if self._building is not None:
+            slide = self._building[1]
+            self._building = None
+            if slide.manager is None and not slide.retained:
+                slide.teardown()
+
+
+class ThumbnailCell(RecycleDataViewBehavior, ButtonBehavior, BoxLayout):
+    index = NumericProperty(0)
+    title = StringProperty('')
+    current = BooleanProperty(False)
+    texture = ObjectProperty(None, allownone=True)
+    overview = ObjectProperty(None, allownone=True)
+
+    def refresh_view_attrs(self, rv, index, data):
+        thumbnails = rv.overview.thumbnails
+        thumbnails.cancel(self._show_thumbnail)
+        self.texture = None
+        super(ThumbnailCell, self).refresh_view_attrs(rv, index, data)
+        self.overview = rv.overview
+        thumbnails.request(self.index, self._show_thumbnail)
+
+    def _show_thumbnail(self, index, texture):
+        if index == self.index:
+            self.texture = texture
+
+    def on_release(self):
+        self.overview.choose(self.index)
+
+
+class SlideOverview(BoxLayout):
+    """A grid of thumbnails of the slides, searchable by title; choosing a slide goes to it."""
+
+    columns = NumericProperty(OVERVIEW_COLUMNS)
+    cell_height = NumericProperty(100)
+
+    def __init__(self, slideshow, thumbnails, **kwargs):
+        super(SlideOverview, self).__init__(**kwargs)
+        self.slideshow = slideshow
+        self.thumbnails = thumbnails
+        self.ids.grid.overview = self
+        self.bind(width=self._update_cell_height, columns=self._update_cell_height)
+        self.search('')
+
+    @property
+    def searching(self):
+        return self.ids.search.focus
+
+    def _update_cell_height(self, *args):
+        layout = self.ids.grid.layout_manager
+        cell_width = (self.width - layout.padding[0] - layout.padding[2] - layout.spacing[0] * (self.columns - 1))
+        self.cell_height = cell_width / self.columns * self.slideshow.root.ratio + layout.spacing[1] * 3
+
+    def search(self, query):
+        titles = self.slideshow.titles.titles
+        current = self.slideshow.current_slide_index
+        self.ids.grid.data = [{'index': i, 'title': titles[i], 'current': i == current}
+                              for i in self.slideshow.find(query)]
+
+    def choose(self, index):
+        self.slideshow.toggle_overview()
+        self.slideshow.goto(index)
+
+    def choose_first(self):
+        if self.ids.grid.data:
+            self.choose(self.ids.grid.data[0]['index'])
+
+    def scroll_to(self, index):
+        position = next((i for i, item in enumerate(self.ids.grid.data) if item['index'] == index), 0)
+        rows = math.ceil(len(self.ids.grid.data) / self.columns)
+        self.ids.grid.scroll_y = 1 - position // self.columns / max(rows - 1, 1)
+
+
+Builder.load_string('''
+<ThumbnailCell>:
+    orientation: 'vertical'
+    padding: 4
+    canvas.before:
+        Color:
+            rgba: (0.25, 0.45, 0.85, 1) if self.current else (0.15, 0.15, 0.15, 1)
+        Rectangle:
+            pos: self.pos
+            size: self.size
+    Image:
+        texture: root.texture
+        color: (1, 1, 1, 1) if root.texture else (0, 0, 0, 0)
+        fit_mode: 'contain'
+    Label:
+        text: ('%d  %s' % (root.index + 1, root.title)).strip()
+        size_hint_y: None
+        height: self.font_size * 1.6
+        text_size: self.width, None
+        shorten: True
+
+<SlideOverview>:
+    orientation: 'vertical'
+    canvas.before:
+        Color:
+            rgba: 0, 0, 0, 0.9
+        Rectangle:
+            pos: self.pos
+            size: self.size
+    TextInput:
+        id: search
+        size_hint_y: None
+        height: self.minimum_height
+        multiline: False
+        hint_text: 'Search slide titles'
+        on_text: root.search(self.text)
+        on_text_validate: root.choose_first()
+    RecycleView:
+        id: grid
+        viewclass: 'ThumbnailCell'
+        RecycleGridLayout:
+            cols: root.columns
+            default_size: None, root.cell_height
+            default_size_hint: 1, None
+            size_hint_y: None
+            height: self.minimum_height
+            spacing: 8
+            padding: 8
+''')
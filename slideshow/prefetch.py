@@ -0,0 +1,113 @@
+import queue
+import threading
+from collections import OrderedDict
+from functools import partial
+
+from kivy import Logger
+from kivy.clock import Clock
+
+
+class PrefetchWorker(threading.Thread):
+
+    def __init__(self, prefetcher):
+        super().__init__()
+        self.prefetcher = prefetcher
+        self.daemon = True
+        self.stop_event = threading.Event()
+
+    def run(self):
+        while not self.stop_event.is_set():
+            try:
+                index, slide = self.prefetcher.requests.get(timeout=0.5)
+            except queue.Empty:
+                continue
+
+            if not self.prefetcher.wanted(index):
+                self.prefetcher.done(index)
+                continue
+
+            try:
+                data = slide.prefetch_load()
+            except Exception:
+                Logger.exception('Prefetch: Couldn\'t load assets of slide %d' % index)
+                data = None
+
+            if data is None:
+                self.prefetcher.done(index)
+            else:
+                Clock.schedule_once(partial(self.prefetcher.handover, index, slide, data), 0)
+
+
+class Prefetcher:
+    """Loads the assets of the slides around the current one while it is showing.
+
+    Decoding (``Slide.prefetch_load()``) happens on a worker thread; the result is handed to the slide on the
+    main thread (``Slide.prefetch_ready()``), where anything that needs the GL context is created. At most
+    ``window`` slides either side of the current one are prefetched, and the handed-over data is kept below
+    ``max_bytes``, dropping the slides furthest from the current one first.
+    """
+
+    def __init__(self, slides, window=1, max_bytes=256 * 1024 * 1024):
+        self.slides = slides
+        self.window = window
+        self.max_bytes = max_bytes
+        self.current_index = -1
+
+        self.requests = queue.Queue()
+        self._lock = threading.Lock()
+        self._pending = set()
+        self._ready = OrderedDict()  # index -> (slide, bytes)
+
+        self.worker = PrefetchWorker(self)
+        self.worker.start()
+
+    @property
+    def prefetched_bytes(self):
+        return sum(nbytes for _, nbytes in self._ready.values())
+
+    def wanted(self, index):
+        return abs(index - self.current_index) <= self.window
+
+    def done(self, index):
+        with self._lock:
+            self._pending.discard(index)
+
+    def update(self, index):
+        """Called on the main thread whenever the current slide changes."""
+        self.current_index = index
+
+        for i in [i for i in self._ready if not self.wanted(i)]:
+            self._drop(i)
+
+        # nearest slides first, next before previous
+        for offset in range(1, self.window + 1):
+            for i in (index + offset, index - offset):
+                if 0 <= i < len(self.slides) and i not in self._ready:
+                    with self._lock:
+                        if i in self._pending:
+                            continue
+                        self._pending.add(i)
+                    self.requests.put((i, self.slides[i]))
+
+    def handover(self, index, slide, data, *args):
+        self.done(index)
+        if not self.wanted(index) or index == self.current_index and slide.built:
+            return
+
+        nbytes = slide.prefetch_ready(data)
+        self._ready[index] = (slide, nbytes)
+
+        while self.prefetched_bytes > self.max_bytes:
+            furthest = max(self._ready, key=lambda i: abs(i - self.current_index))
+            self._drop(furthest)
+            if furthest == index:
+                break
+
+    def _drop(self, index):
+        slide, _ = self._ready.pop(index)
+        slide.drop_prefetched()
+
+    def stop(self):
+        self.worker.stop_event.set()
+        for i in list(self._ready):
+            self._drop(i)
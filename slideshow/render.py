@@ -0,0 +1,248 @@
+"""Render the slides of a deck to image files without running the slideshow, e.g. to make thumbnails or handouts in
+CI on machines without a display or GPU (SDL's offscreen driver with a software OpenGL such as Mesa's llvmpipe is
+enough). From the command line::
+
+    python -m slideshow.render mydeck.py:make_slideshow out/ --width 1280 --format jpeg --pdf handout.pdf
+
+where ``make_slideshow`` is a function in mydeck.py returning the Slideshow (or a Slideshow created when the file
+is imported). Each worker process builds its own copy of the deck once and writes every slide it renders straight to
+its file, so large decks are exported in parallel and nothing is held in memory for longer than one slide (or, for
+the PDF, one batch of pages).
+"""
+import argparse
+import contextlib
+import importlib
+import importlib.util
+import multiprocessing
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+from PIL import Image
+from kivy.clock import Clock
+from kivy.lang import Builder
+from kivy.resources import resource_add_path
+from kivy.uix.screenmanager import NoTransition
+
+from .base import widget_to_pil
+
+DEFAULT_WIDTH = 1920
+SETTLE_FRAMES = 3  # frames after switching slide, for the transition and layout to finish
+FORMATS = {'png': 'PNG', 'jpeg': 'JPEG', 'jpg': 'JPEG'}
+HANDOUT_BATCH = 16  # pages held in memory and written to the PDF at once
+WORKER_ENVIRONMENT = {
+    'SDL_VIDEODRIVER': 'offscreen',
+    'KIVY_NO_ARGS': '1',
+    'KIVY_NO_CONSOLELOG': '1',
+}
+
+
+def fit_size(ratio, width, height=None):
+    """The size of a slide with the given ratio (height / width, as ARLayout.ratio) that fits in width x height,
+    or that is width wide if height is None."""
+    if height is None or width * ratio <= height:
+        return int(width), max(int(round(width * ratio)), 1)
+    return max(int(round(height / ratio)), 1), int(height)
+
+
+def load_deck(spec):
+    """Load the Slideshow named by "path/to/deck.py:name" or "package.module:name", where name is a Slideshow or
+    a function returning one."""
+    location, _, name = spec.rpartition(':')
+    if not location or not name:
+        raise ValueError("the deck must be given as file.py:name or module:name, not %r" % spec)
+
+    if location.endswith('.py') or os.path.sep in location:
+        path = os.path.abspath(location)
+        directory = os.path.dirname(path)
+        sys.path.insert(0, directory)
+        resource_add_path(directory)  # assets are usually given relative to the deck
+        module_spec = importlib.util.spec_from_file_location('slideshow_deck', path)
+        module = importlib.util.module_from_spec(module_spec)
+        module_spec.loader.exec_module(module)
+    else:
+        module = importlib.import_module(location)
+
+    deck = getattr(module, name)
+    return deck() if callable(deck) else deck
+
+
+class SlideRenderer(object):
+    """Renders the slides of a Slideshow, without running it, to PIL images at a chosen size.
+
+    The Slideshow's root (an ARLayout) is laid out at the largest size with its ratio that fits in width x height,
+    and each slide is shown in turn and drawn into an offscreen framebuffer, with the deck's background and on the
+    window's clear colour.
+    """
+
+    def __init__(self, slideshow, width=DEFAULT_WIDTH, height=None):
+        self.slideshow = slideshow
+        self.size = fit_size(slideshow.root.ratio, width, height)
+
+        root = slideshow.root
+        root.size_hint = None, None
+        root.pos = 0, 0
+        root.size = self.size
+
+    def __len__(self):
+        return len(self.slideshow.slides)
+
+    def render(self, index):
+        slideshow = self.slideshow
+        if index != slideshow.current_slide_index:
+            slideshow.switch_slide(index, transition=NoTransition())
+        for _ in range(SETTLE_FRAMES):
+            # as EventLoop.idle() does, without reading input or drawing the window
+            Clock.tick()
+            Builder.sync()
+            Clock.tick_draw()
+            Builder.sync()
+
+        image = widget_to_pil(slideshow.root)
+        if image.size != self.size:
+            image = image.resize(self.size)
+        return image
+
+    def save(self, index, path, quality=90):
+        image = self.render(index)
+        image_format = FORMATS[os.path.splitext(path)[1][1:].lower()]
+        image.save(path, image_format, **({'quality': quality} if image_format == 'JPEG' else {}))
+        return path
+
+
+class HandoutWriter(object):
+    """Writes images to a PDF, one page per image, in batches of up to ``batch`` pages.
+
+    Each batch is written with a single save (appending to the PDF after the first), rather than a save per page,
+    as appending re-reads the whole PDF; and only one batch is held in memory, so the handout of a large deck
+    never is. Images are given as PIL images or as paths, which are only opened when their batch is written. The
+    last batch is written by close().
+    """
+
+    def __init__(self, path, resolution=150., batch=HANDOUT_BATCH):
+        self.path = path
+        self.resolution = resolution
+        self.batch = batch
+        self.pages = 0
+        self._pending = []
+
+    def add(self, image):
+        self._pending.append(image)
+        if len(self._pending) >= self.batch:
+            self.flush()
+
+    def flush(self):
+        if not self._pending:
+            return
+        images = [self._load(image) for image in self._pending]
+        images[0].save(self.path, 'PDF', resolution=self.resolution, save_all=True, append_images=images[1:],
+                       append=self.pages > 0)
+        self.pages += len(images)
+        self._pending = []
+
+    def close(self):
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    @staticmethod
+    def _load(image):
+        if isinstance(image, str):
+            with Image.open(image) as file:
+                return file.convert('RGB')
+        return image
+
+
+_renderer = None  # the worker process's SlideRenderer
+
+
+def _start_worker(deck, width, height):
+    global _renderer
+    _renderer = SlideRenderer(load_deck(deck), width, height)
+
+
+def _deck_length():
+    return len(_renderer)
+
+
+def _render_slide(index, path, quality):
+    return index, _renderer.save(index, path, quality)
+
+
+@contextlib.contextmanager
+def _worker_environment():
+    # spawned workers inherit the environment, and create their windows while importing kivy
+    previous = {name: os.environ.get(name) for name in WORKER_ENVIRONMENT}
+    for name, value in WORKER_ENVIRONMENT.items():
+        os.environ.setdefault(name, value)
+    try:
+        yield
+    finally:
+        for name, value in previous.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+
+
+def slide_filename(index, count, image_format='png'):
+    """The file a slide is rendered to, numbered from 1 and padded so that the files sort in order."""
+    return 'slide-%0*d.%s' % (len(str(count)), index + 1, image_format)
+
+
+def render_deck(deck, output_dir, width=DEFAULT_WIDTH, height=None, image_format='png', quality=90, workers=None,
+                slides=None):
+    """Render the slides of a deck to image files in output_dir, with a pool of worker processes.
+
+    A generator of (slide index, path), in slide order, each given as soon as its file has been written.
+
+    :param deck: the deck, as accepted by load_deck(); each worker loads its own copy once, when it starts, and
+                 workers are only started as there are slides for them
+    :param image_format: 'png' or 'jpeg'
+    :param quality: of JPEG files
+    :param workers: number of worker processes; by default one per core
+    :param slides: indices of the slides to render; by default all of them
+    """
+    image_format = image_format.lower()
+    if image_format not in FORMATS:
+        raise ValueError("unsupported image format %r" % image_format)
+    os.makedirs(output_dir, exist_ok=True)
+
+    workers = workers or os.cpu_count() or 1
+    with _worker_environment():
+        # spawned, as forking a process with a GL context doesn't work
+        with ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context('spawn'),
+                                 initializer=_start_worker, initargs=(deck, width, height)) as executor:
+            count = executor.submit(_deck_length).result()
+            indices = list(range(count) if slides is None else slides)
+            paths = [os.path.join(output_dir, slide_filename(index, count, image_format)) for index in indices]
+            yield from executor.map(_render_slide, indices, paths, [quality] * len(paths))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Render the slides of a deck to image files.')
+    parser.add_argument('deck', help='file.py:name or module:name of a Slideshow, or of a function returning one')
+    parser.add_argument('output_dir')
+    parser.add_argument('--width', type=int, default=DEFAULT_WIDTH)
+    parser.add_argument('--height', type=int, default=None,
+                        help='fit the slides in width x height, rather than making them width wide')
+    parser.add_argument('--format', choices=sorted(FORMATS), default='png')
+    parser.add_argument('--quality', type=int, default=90, help='of JPEG files')
+    parser.add_argument('--workers', type=int, default=None, help='number of processes; one per core by default')
+    parser.add_argument('--pdf', default=None, help='also write the slides to this PDF, one per page')
+    args = parser.parse_args(argv)
+
+    with HandoutWriter(args.pdf) if args.pdf else contextlib.nullcontext() as handout:
+        for index, path in render_deck(args.deck, args.output_dir, args.width, args.height, args.format,
+                                       args.quality, args.workers):
+            print(path)
+            if handout is not None:
+                handout.add(path)
+
+
+if __name__ == '__main__':
+    main()
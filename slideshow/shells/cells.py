@@ -0,0 +1,83 @@
+import ast
+import hashlib
+import re
+import threading
+from collections import OrderedDict
+
+# a line starting with "# %%" begins a new cell, as in Spyder, VS Code and jupytext
+CELL_MARKER = re.compile(r'^# ?%%', re.MULTILINE)
+COMPILE_CACHE_SIZE = 256  # code objects kept; live re-running compiles a new one for almost every edit
+
+
+_compiled = OrderedDict()  # (source hash, first line, filename) -> code object, least recently used first
+_compiled_lock = threading.Lock()
+
+
+def source_hash(source):
+    return hashlib.sha1(source.encode('utf8')).hexdigest()
+
+
+def compile_source(source, line=1, filename='<code>'):
+    """Compile source, starting at the given line number, once per distinct source (of the COMPILE_CACHE_SIZE most
+    recently used); raises SyntaxError."""
+    key = source_hash(source), line, filename
+    with _compiled_lock:
+        code = _compiled.get(key)
+        if code is not None:
+            _compiled.move_to_end(key)
+    if code is None:
+        # padded so that line numbers in tracebacks match the editor
+        code = compile('\n' * (line - 1) + source, filename, 'exec')
+        with _compiled_lock:
+            _compiled[key] = code
+            while len(_compiled) > COMPILE_CACHE_SIZE:
+                _compiled.popitem(last=False)
+    return code
+
+
+class Cell(object):
+    """A cell of a script, with the names it binds and the names it reads (at module level or in functions)."""
+
+    def __init__(self, source, index, line):
+        self.source = source
+        self.index = index
+        self.line = line  # of the first line of the cell in the script, counting from 1
+        self.hash = source_hash(source)
+        self.defines = set()
+        self.uses = set()
+
+        try:
+            tree = ast.parse(source)
+        except SyntaxError:
+            return  # reported when it's run
+
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Name):
+                (self.uses if isinstance(node.ctx, ast.Load) else self.defines).add(node.id)
+            elif isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+                self.defines.add(node.name)
+            elif isinstance(node, ast.alias):
+                self.defines.add((node.asname or node.name).split('.')[0])
+
+    def compile(self):
+        return compile_source(self.source, self.line)
+
+
+def split_cells(source):
+    starts = [0] + [match.start() for match in CELL_MARKER.finditer(source) if match.start() > 0]
+    ends = starts[1:] + [len(source)]
+    return [Cell(source[start:end], i, source.count('\n', 0, start) + 1)
+            for i, (start, end) in enumerate(zip(starts, ends))]
+
+
+def cells_to_run(cells, previous_hashes):
+    """The cells that changed since the cells with previous_hashes were run, and the cells after them that use a
+    name bound by a cell that is re-run."""
+    stale = set()
+    run = []
+    for i, cell in enumerate(cells):
+        changed = i >= len(previous_hashes) or previous_hashes[i] != cell.hash
+        if changed or cell.uses & stale:
+            run.append(cell)
+            stale |= cell.defines
+    return run
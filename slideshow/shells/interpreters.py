@@ -0,0 +1,176 @@
+import contextlib
+import contextvars
+import queue
+import sys
+import threading
+from collections import deque
+
+from kivy import Logger
+
+POOL_WORKERS = 2
+
+# where print() and friends write to in the current context; None means the real sys.stdout/sys.stderr
+_output = contextvars.ContextVar('slideshow_output', default=None)
+_router_lock = threading.Lock()
+
+
+class OutputRouter(object):
+    """Stands in for sys.stdout or sys.stderr, writing to the output of the current context, if there is one.
+
+    As each thread has its own context, code run for different slides at the same time keeps its output
+    separate, and output from anywhere else still goes to the real stream.
+    """
+
+    def __init__(self, stream):
+        self.stream = stream
+
+    def write(self, s):
+        write = _output.get()
+        if write is None:
+            return self.stream.write(s)
+        write(s)
+        return len(s)
+
+    def writelines(self, lines):
+        for line in lines:
+            self.write(line)
+
+    def flush(self):
+        if _output.get() is None:
+            self.stream.flush()
+
+    def isatty(self):
+        return _output.get() is not None or self.stream.isatty()
+
+    def __getattr__(self, name):
+        return getattr(self.stream, name)
+
+
+def install_output_router():
+    with _router_lock:
+        if not isinstance(sys.stdout, OutputRouter):
+            sys.stdout = OutputRouter(sys.stdout)
+        if not isinstance(sys.stderr, OutputRouter):
+            sys.stderr = OutputRouter(sys.stderr)
+
+
+@contextlib.contextmanager
+def capture_output(write):
+    """Send what is printed in this context (this thread, not others) to write()."""
+    install_output_router()
+    token = _output.set(write)
+    try:
+        yield
+    finally:
+        _output.reset(token)
+
+
+class Session(object):
+    """Runs functions for one slide on an InterpreterPool, one at a time and in order, with its output going to
+    ``write``. Functions submitted to different sessions can run at the same time."""
+
+    def __init__(self, pool, write):
+        self.pool = pool
+        self.write = write
+        self.closed = False
+        self._jobs = deque()
+        self._scheduled = False  # queued on, or running on, the pool
+        self._worker = None  # the worker running one of its functions
+
+    @property
+    def pending(self):
+        return len(self._jobs)
+
+    def submit(self, fn):
+        with self.pool.lock:
+            if self.closed:
+                return
+            self._jobs.append(fn)
+            if not self._scheduled:
+                self._scheduled = True
+                self.pool.queue.put(self)
+
+    def close(self):
+        """Drop the functions that haven't started. One that is running carries on (a thread can't be stopped), so
+        its worker is replaced, in case it never finishes."""
+        with self.pool.lock:
+            self.closed = True
+            self._jobs.clear()
+            if self._worker is not None:
+                self.pool._replace(self._worker)
+
+    def _run_next(self, worker):
+        # on a pool thread; returns whether there is more to run
+        with self.pool.lock:
+            if not self._jobs:
+                self._scheduled = False
+                return False
+            fn = self._jobs.popleft()
+            self._worker = worker
+
+        try:
+            with capture_output(self.write):
+                try:
+                    fn()
+                except Exception:
+                    Logger.exception('InterpreterPool: Uncaught exception')
+        finally:
+            with self.pool.lock:
+                self._worker = None
+        return True
+
+
+class InterpreterWorker(threading.Thread):
+
+    def __init__(self, pool):
+        super().__init__()
+        self.pool = pool
+        self.daemon = True
+        self.retired = False  # replaced while running the function of a closed session; exits once it returns
+
+    def run(self):
+        while not self.retired:
+            session = self.pool.queue.get()
+            # runs the session's functions until it has none left, so that they stay in order
+            while session._run_next(self) and not self.retired:
+                pass
+
+
+class InterpreterPool(object):
+    """A fixed number of threads that run the code of all the REPL slides, each through its own Session.
+
+    Code that never returns (``while True: pass``) can't be stopped, but a worker running it for a slide that has
+    been closed is replaced, so that it doesn't take a thread from the other slides for the rest of the talk.
+    """
+
+    def __init__(self, workers=POOL_WORKERS):
+        self.lock = threading.Lock()
+        self.queue = queue.Queue()
+        self.workers = [InterpreterWorker(self) for _ in range(workers)]
+        for worker in self.workers:
+            worker.start()
+        install_output_router()
+
+    def session(self, write):
+        return Session(self, write)
+
+    def _replace(self, worker):
+        # with the lock held
+        if worker.retired:
+            return
+        worker.retired = True
+        replacement = InterpreterWorker(self)
+        self.workers[self.workers.index(worker)] = replacement
+        replacement.start()
+
+
+_default_pool = None
+_default_pool_lock = threading.Lock()
+
+
+def default_pool():
+    global _default_pool
+    with _default_pool_lock:
+        if _default_pool is None:
+            _default_pool = InterpreterPool()
+        return _default_pool
@@ -0,0 +1,98 @@
+import threading
+
+from kivy.clock import Clock
+from kivy.properties import NumericProperty
+
+
+def tail_lines(text, lines):
+    """Return the last lines lines of text (text itself if it has no more than that)."""
+    index = len(text)
+    for _ in range(lines + 1):
+        index = text.rfind('\n', 0, index)
+        if index < 0:
+            return text
+    return text[index + 1:]
+
+
+class OutputBuffer(object):
+    """Collects output written from any thread and hands it to the UI thread in one piece per frame.
+
+    Writes only append to a list; at most one flush is scheduled per frame (or per ``interval`` seconds), which
+    passes everything written since the last flush to ``callback`` as a single string. If ``max_lines`` is
+    given, pending output beyond that many lines is discarded from the front as it arrives, so a flood of output
+    costs bounded memory and only its tail is ever rendered.
+    """
+
+    def __init__(self, callback, max_lines=0, interval=0):
+        self.callback = callback
+        self.max_lines = max_lines
+        self._lock = threading.Lock()
+        self._chunks = []
+        self._pending_lines = 0
+        self._trigger = Clock.create_trigger(self.flush, interval)
+
+    def write(self, data):
+        if not data:
+            return
+        with self._lock:
+            self._chunks.append(data)
+            if self.max_lines > 0:
+                self._pending_lines += data.count('\n')
+                if self._pending_lines > 2 * self.max_lines:
+                    self._chunks = [tail_lines(''.join(self._chunks), self.max_lines)]
+                    self._pending_lines = self.max_lines
+        self._trigger()
+
+    def flush(self, *args):
+        with self._lock:
+            data = ''.join(self._chunks)
+            self._chunks = []
+            self._pending_lines = 0
+        if data:
+            self.callback(data)
+
+
+class ScrollbackBehavior(object):
+    """TextInput mixin for append-only console output with a bounded scrollback."""
+
+    scrollback_lines = NumericProperty(10000)
+    '''Maximum number of lines of output kept; older lines are trimmed from the top (0 keeps everything)
+    '''
+
+    _output_lines = 0
+
+    def append_output(self, output):
+        """Append output at the end of the text and trim the scrollback.
+
+        Appending re-lays out only the affected lines, rather than the whole text as ``text += output`` does;
+        trimming happens once the scrollback has grown by a quarter, so its cost is amortised. Returns the number
+        of characters removed from the start of the text.
+        """
+        limit = int(self.scrollback_lines)
+        output_lines = output.count('\n')
+
+        if 0 < limit <= output_lines:
+            # the new output alone fills the scrollback
+            removed = len(self.text) + len(output)
+            self.text = tail_lines(output, limit)
+            self._output_lines = limit
+            self.do_cursor_movement('cursor_end', control=True)
+            return removed - len(self.text)
+
+        if self.text:
+            self.do_cursor_movement('cursor_end', control=True)
+            self.insert_text(output, from_undo=True)  # from_undo: don't keep output in the undo history
+        else:
+            # insert_text() does nothing until the text has been laid out
+            self.text = output
+            self.do_cursor_movement('cursor_end', control=True)
+        self._output_lines += output_lines
+
+        if 0 < limit and self._output_lines > limit * 1.25:
+            text = self.text
+            trimmed = tail_lines(text, limit)
+            self.text = trimmed
+            self._output_lines = limit
+            self.do_cursor_movement('cursor_end', control=True)
+            return len(text) - len(trimmed)
+        return 0
@@ -0,0 +1,166 @@
+import codecs
+import itertools
+import os
+import signal
+import subprocess
+import threading
+import uuid
+
+from kivy import Logger
+
+try:
+    import pty
+    import termios
+except ImportError:  # not available on Windows
+    pty = None
+
+READ_SIZE = 64 * 1024
+
+# marks the end of a command's output; chosen so it can't plausibly turn up in the output itself
+SENTINEL_START = '\x1e'
+INTERRUPT_DELAY = 0.1  # seconds an interrupted command is given to exit before the shell is asked for its status
+
+
+def available():
+    return pty is not None
+
+
+class PtyShell(object):
+    """A long-lived shell process on a pseudo terminal, to which commands are sent one at a time.
+
+    Starting the shell once, rather than a process per command, amortises its startup and keeps state such as
+    the working directory and environment variables between commands. Output is read by a single thread and
+    passed to ``on_output(chunk)`` as it arrives. After each command the shell prints a sentinel line with the
+    exit status and working directory, which is stripped from the output and reported with
+    ``on_complete(status, cwd)``; if the shell itself exits, ``on_complete(None, None)`` is called.
+
+    The terminal has echo and output post-processing turned off, so output is exactly what the command writes.
+    """
+
+    def __init__(self, command, on_output, on_complete, cwd=None, env=None):
+        if pty is None:
+            raise OSError('pseudo terminals are not supported on this platform')
+
+        self.on_output = on_output
+        self.on_complete = on_complete
+        self.cwd = os.path.abspath(cwd or os.getcwd())
+
+        self._token = SENTINEL_START + uuid.uuid4().hex + ' '
+        self._commands = itertools.count(1)
+        self._command = 0  # the command whose output is currently being read
+        self._completed = 0  # the last command reported to on_complete
+        self._write_lock = threading.Lock()
+
+        environ = dict(os.environ)
+        environ.update({'PS1': '', 'PS2': '', 'TERM': 'dumb'})
+        if env:
+            environ.update(env)
+
+        self._fd, child_fd = pty.openpty()
+        attrs = termios.tcgetattr(child_fd)
+        attrs[1] &= ~termios.OPOST  # no \n -> \r\n
+        attrs[3] &= ~termios.ECHO  # the console shows the command as it was typed
+        termios.tcsetattr(child_fd, termios.TCSANOW, attrs)
+
+        try:
+            self.process = subprocess.Popen(command, stdin=child_fd, stdout=child_fd, stderr=child_fd,
+                                            cwd=self.cwd, env=environ, start_new_session=True)
+        except Exception:
+            os.close(self._fd)
+            raise
+        finally:
+            os.close(child_fd)
+
+        self._reader = threading.Thread(target=self._read, daemon=True)
+        self._reader.start()
+
+    @property
+    def alive(self):
+        return self.process.poll() is None
+
+    def run(self, command_line):
+        """Send a command line to the shell; returns immediately."""
+        self._command = next(self._commands)
+        self._write(command_line.rstrip('\n') + '\n' + self._sentinel_command())
+
+    def interrupt(self):
+        """Interrupt the running command (as Ctrl-C would)."""
+        try:
+            os.killpg(self.process.pid, signal.SIGINT)
+        except OSError:
+            return
+        # the command may have consumed the sentinel command from its stdin, so ask again once it has exited (had
+        # the shell already read it, the repeat is ignored)
+        timer = threading.Timer(INTERRUPT_DELAY, self._repeat_sentinel, (self._command,))
+        timer.daemon = True
+        timer.start()
+
+    def close(self):
+        if self.alive:
+            try:
+                os.killpg(self.process.pid, signal.SIGHUP)
+                self.process.wait(1)
+            except (OSError, subprocess.TimeoutExpired):
+                self.process.kill()
+                self.process.wait()
+        # the reader thread closes the terminal once it sees the end of the output
+
+    def _sentinel_command(self):
+        # leaves $? as the command set it
+        return ("__slideshow_status=$?; printf '\\036%s %d %%s %%s\\n' \"$__slideshow_status\" \"$PWD\"; "
+                "(exit $__slideshow_status)\n" % (self._token[1:-1], self._command))
+
+    def _repeat_sentinel(self, command):
+        if self.alive and command == self._command != self._completed:
+            self._write(self._sentinel_command())
+
+    def _write(self, text):
+        data = text.encode('utf8')
+        with self._write_lock:
+            try:
+                while data:
+                    data = data[os.write(self._fd, data):]
+            except OSError:
+                Logger.warning('PtyShell: the shell has exited')
+
+    def _read(self):
+        decoder = codecs.getincrementaldecoder('utf8')(errors='replace')
+        pending = ''
+        while True:
+            try:
+                data = os.read(self._fd, READ_SIZE)
+            except OSError:  # EIO once the shell has exited
+                data = b''
+            pending += decoder.decode(data, final=not data)
+
+            while True:
+                start = pending.find(self._token)
+                end = pending.find('\n', start)
+                if start < 0 or end < 0:
+                    break
+                if start > 0:
+                    self.on_output(pending[:start])
+                command, status, cwd = pending[start + len(self._token):end].split(' ', 2)
+                pending = pending[end + 1:]
+                # after an interrupt the sentinel may come twice: from the command line and from interrupt()
+                if int(command) == self._command != self._completed:
+                    self._completed = self._command
+                    self.cwd = cwd
+                    self.on_complete(int(status), cwd)
+
+            if not data:
+                break
+
+            # hold back anything that could be the start of a sentinel split across reads
+            keep = pending.rfind(SENTINEL_START)
+            if keep < 0 or len(pending) - keep > len(self._token) + 4096:
+                keep = len(pending)
+            if keep > 0:
+                self.on_output(pending[:keep])
+                pending = pending[keep:]
+
+        if pending:
+            self.on_output(pending)
+        os.close(self._fd)
+        self.process.wait()
+        self.on_complete(None, None)
@@ -1,96 +1,67 @@
 import code
+import functools
 import sys
-import threading
 
 from kivy.base import runTouchApp
-from kivy.clock import Clock
 from kivy.config import Config
 from kivy.properties import ListProperty, NumericProperty, StringProperty
 from kivy.uix.boxlayout import BoxLayout
 from kivy.uix.textinput import TextInput
 
-Config.set('kivy', 'exit_on_escape', '0')
-
-
-class PseudoFile(object):
-
-    def __init__(self, sh):
-        self.sh = sh
+from .interpreters import default_pool
+from .output import OutputBuffer, ScrollbackBehavior
 
-    def write(self, s):
-        self.sh.write(s)
-
-    def writelines(self, lines):
-        for line in lines:
-            self.write(line)
-
-    def flush(self):
-        pass
+Config.set('kivy', 'exit_on_escape', '0')
 
-    def isatty(self):
-        return True
+THROUGHPUT_INTERVAL = 0.1
 
 
 class Shell(code.InteractiveConsole):
     "Wrapper around Python that can filter input/output to the shell"
 
-    def __init__(self, root):
-        code.InteractiveConsole.__init__(self)
-        self.thread = None
+    def __init__(self, root, locals=None, sandbox=None):
+        """
+        :param sandbox: a sandbox.Sandbox to run the code in, in a child process, rather than in this one (locals
+                        is then ignored)
+        """
+        code.InteractiveConsole.__init__(self, locals)
         self.root = root
+        self.sandbox = sandbox
+        self.output_written = False
 
     def write(self, data):
-        import functools
-        Clock.schedule_once(functools.partial(self.root.show_output, data), 0)
+        self.output_written = True
+        self.root.output.write(data)
 
     def push(self, line):
+        if self.sandbox is not None:
+            return self.sandbox.push(line, self.write)
         return code.InteractiveConsole.push(self, line)
 
-    def raw_input(self, prompt="") -> str | bytes:
-        return self.root.get_input(prompt)
+    def interrupt(self):
+        """Interrupt the running code; only possible in a sandbox."""
+        if self.sandbox is not None:
+            self.sandbox.interrupt()
 
     def runcode(self, code):
         """Execute a code object.
 
         When an exception occurs, self.showtraceback() is called to
-        display a traceback.  All exceptions are caught except
-        SystemExit, which is reraised.
-
-        A note about KeyboardInterrupt: this exception may occur
-        elsewhere in this code, and may not always be caught.  The
-        caller should be prepared to deal with it.
+        display a traceback. SystemExit is reported in the same way,
+        as there is no interpreter to exit. What the code prints goes
+        to the output of the session it runs in (see
+        interpreters.capture_output).
 
         """
-        org_stdout = sys.stdout
-        sys.stdout = PseudoFile(self)
+        if self.sandbox is not None:
+            self.sandbox.runcode(code, self.write)
+            return
         try:
             exec(code, self.locals)
-        except SystemExit:
-            raise
         except:
             self.showtraceback()
-        finally:
-            sys.stdout = org_stdout
-
-    def interact(self, banner=None, _=None):
-        """Closely emulate the interactive Python console.
 
-        The optional banner argument specify the banner to print
-        before the first interaction; by default it prints a banner
-        similar to the one printed by the real Python interpreter,
-        followed by the current class name in parentheses (so as not
-        to confuse this with the real interpreter -- since it's so
-        close!).
-
-        """
-        try:
-            sys.ps1
-        except AttributeError:
-            sys.ps1 = ">>> "
-        try:
-            sys.ps2
-        except AttributeError:
-            sys.ps2 = "... "
+    def banner(self, banner=None):
         cprt = 'Type "help", "copyright", "credits" or "license" for more information.'
         if banner is None:
             self.write("Python %s on %s\n%s\n(%s)\n" %
@@ -98,49 +69,15 @@ class Shell(code.InteractiveConsole):
                         self.__class__.__name__))
         elif banner is not False:
             self.write("%s\n" % str(banner))
-        more = 0
-        while 1:
-            try:
-                if more:
-                    prompt = sys.ps2
-                else:
-                    prompt = sys.ps1
-                try:
-                    line = self.raw_input(prompt)
-                    # Can be None if sys.stdin was redefined
-                    encoding = getattr(sys.stdin, "encoding", None)
-                    if encoding and not isinstance(line, str):
-                        line = line.decode(encoding)
-                except EOFError:
-                    self.write("\n")
-                    break
-                else:
-                    more = self.push(line)
-            except KeyboardInterrupt:
-                self.write("\nKeyboardInterrupt\n")
-                self.resetbuffer()
-                more = 0
-
-
-class InteractiveThread(threading.Thread):
-
-    def __init__(self, sh, banner):
-        super(InteractiveThread, self).__init__()
-        self._sh = sh
-        self._sh.thread = self
-        self.daemon = True
-        self.banner = banner
-
-    def run(self):
-        self._sh.interact(self.banner)
-
-
-class InteractiveShellInput(TextInput):
-    __events__ = ('on_ready_to_input',)
+
+
+class InteractiveShellInput(ScrollbackBehavior, TextInput):
+    __events__ = ('on_ready_to_input', 'on_interrupt')
 
     def __init__(self, history=None, **kwargs):
         super(InteractiveShellInput, self).__init__(**kwargs)
         self.last_line = None
+        self._cursor_pos = 0  # start of the line being entered
 
         if history is None:
             history = []
@@ -173,6 +110,11 @@ class InteractiveShellInput(TextInput):
                     self.text += self.history[self.history_index]
             return False
 
+        if keycode[1] == 'c' and modifiers == ['ctrl'] and not self.selection_text:
+            # ctrl-c without a selection to copy
+            self.dispatch('on_interrupt')
+            return True
+
         if keycode[0] == 13:
             # For enter
             self.last_line = self.text[self._cursor_pos:]
@@ -185,11 +127,11 @@ class InteractiveShellInput(TextInput):
     def on_ready_to_input(self, *args):
         pass
 
-    def show_output(self, output):
-        self.text += output
-        Clock.schedule_once(self._set_cursor_val, 0)
+    def on_interrupt(self, *args):
+        pass
 
-    def _set_cursor_val(self, *args):
+    def show_output(self, output):
+        self.append_output(output)
         self._cursor_pos = self.cursor_index()
 
 
@@ -210,51 +152,93 @@ class PythonREPLWidget(BoxLayout):
     '''Indicates the size of the font used for the console
     '''
 
-    def __init__(self, banner=None, history=None, **kwargs):
+    scrollback_lines = NumericProperty(10000)
+    '''Maximum number of lines kept in the console; older lines are trimmed (0 keeps everything)
+    '''
+
+    def __init__(self, banner=None, history=None, throughput=False, namespace=None, pool=None, sandbox=None,
+                 **kwargs):
+        """
+        :param throughput: flush output to the console once every THROUGHPUT_INTERVAL seconds, rather than
+                           every frame, to stay responsive when code prints megabytes of output
+        :param namespace: dict of the interpreter's globals, e.g. to keep them between instances
+        :param pool: the InterpreterPool that runs the code; by default one shared by all REPLs
+        :param sandbox: a sandbox.Sandbox to run the code in, in a child process; it is closed with the widget
+        """
         super(PythonREPLWidget, self).__init__()
 
         self.text_input = InteractiveShellInput(history)
+        self.output = OutputBuffer(self.text_input.show_output, interval=THROUGHPUT_INTERVAL if throughput else 0)
         self.text_input.bind(on_ready_to_input=self.ready_to_input)
+        self.text_input.bind(on_interrupt=self.interrupt)
         self.bind(font_name=self.text_input.setter('font_name'))
         self.bind(font_size=self.text_input.setter('font_size'))
         self.bind(background_color=self.text_input.setter('background_color'))
         self.bind(foreground_color=self.text_input.setter('foreground_color'))
+        self.bind(scrollback_lines=self.text_input.setter('scrollback_lines'))
+        self.bind(scrollback_lines=self._set_output_max_lines)
 
         self.property('font_name').dispatch(self)
         self.property('font_size').dispatch(self)
         self.property('background_color').dispatch(self)
         self.property('foreground_color').dispatch(self)
+        self.property('scrollback_lines').dispatch(self)
 
         self.add_widget(self.text_input)
-        self.sh = Shell(self)
-        self._thread = InteractiveThread(self.sh, banner)
-
-        Clock.schedule_once(self.run_sh, -1)
-        self._ready_to_input = False
-
+        self.sh = Shell(self, namespace, sandbox)
+        # everything the interpreter runs goes through the session, one thing at a time and in order
+        self.session = (pool or default_pool()).session(self.sh.write)
         self.prompt = None
+        self._prompt_due = False
+        self.session.submit(functools.partial(self._start, banner))
+
+    def _set_output_max_lines(self, instance, value):
+        self.output.max_lines = int(value)
 
     def ready_to_input(self, *args):
-        self._ready_to_input = True
+        self.session.submit(functools.partial(self._push, self.text_input.last_line))
+
+    def close(self):
+        """Drop the code still waiting to run; code that is running carries on, unless it is in a sandbox."""
+        self.session.close()
+        if self.sh.sandbox is not None:
+            self.sh.sandbox.close()
 
-    def run_sh(self, *args):
-        self._thread.start()
+    def interrupt(self, *args):
+        self.sh.interrupt()
 
-    def show_output(self, data, dt):
-        self.text_input.show_output(data)
+    def submit(self, fn):
+        """Run fn in this REPL's session, after what has been entered or submitted before."""
+        self.session.submit(functools.partial(self._run_submitted, fn))
 
-    def _show_prompt(self, *args):
-        self.text_input.show_output(self.prompt)
+    # the methods below run in the session, on one of the pool's threads
 
-    def get_input(self, prompt):
-        import time
-        self.prompt = prompt
-        Clock.schedule_once(self._show_prompt, 0.1)
-        while not self._ready_to_input:
-            time.sleep(0.1)
+    def _start(self, banner):
+        self.sh.banner(banner)
+        self.prompt = getattr(sys, 'ps1', '>>> ')
+        self._show_prompt()
 
-        self._ready_to_input = False
-        return self.text_input.last_line
+    def _push(self, line):
+        more = self.sh.push(line)
+        self.prompt = getattr(sys, 'ps2', '... ') if more else getattr(sys, 'ps1', '>>> ')
+        self._show_prompt()
+
+    def _run_submitted(self, fn):
+        self.sh.output_written = False
+        try:
+            fn()
+        except Exception:
+            self.sh.showtraceback()
+        if self.sh.output_written or self._prompt_due:
+            self._show_prompt()
+
+    def _show_prompt(self):
+        # once nothing else is waiting to run, so that output from code submitted together comes out together
+        if self.session.pending == 0:
+            self.output.write(self.prompt)  # through the output buffer, so that it appears after pending output
+            self._prompt_due = False
+        else:
+            self._prompt_due = True
 
 
 if __name__ == '__main__':
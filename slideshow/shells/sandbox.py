@@ -0,0 +1,167 @@
+import base64
+import json
+import marshal
+import os
+import select
+import signal
+import subprocess
+import sys
+import threading
+import time
+
+from kivy import Logger
+
+CHILD_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'sandbox_child.py')
+
+CPU_LIMIT = 30  # seconds of CPU time per command
+MEMORY_LIMIT = 2 * 1024 * 1024 * 1024  # bytes of address space
+INTERRUPT_GRACE = 2  # seconds a timed out command has to stop after being interrupted, before it is killed
+START_TIMEOUT = 10
+
+
+class Sandbox(object):
+    """Runs Python code in a child process, with limits on the CPU time of each command and on memory.
+
+    An infinite loop or a huge allocation then only stops the child: a command that uses more than
+    ``cpu_limit`` seconds of CPU time gets an exception, allocations beyond ``memory_limit`` bytes raise
+    MemoryError, and if ``timeout`` is given, a command still running after that many seconds is interrupted
+    and, failing that, the child is killed and restarted (losing its variables). Output is streamed back over
+    a pipe as it is printed. POSIX only.
+    """
+
+    def __init__(self, cpu_limit=CPU_LIMIT, memory_limit=MEMORY_LIMIT, timeout=None):
+        self.cpu_limit = cpu_limit
+        self.memory_limit = memory_limit
+        self.timeout = timeout
+        self.process = None
+        self.busy = False
+        self.closed = False
+        self._buffer = b''
+        self._start()
+
+    def _start(self):
+        self._buffer = b''
+        self.process = subprocess.Popen([sys.executable, '-u', CHILD_SCRIPT, str(int(self.memory_limit or 0))],
+                                        stdin=subprocess.PIPE, stdout=subprocess.PIPE, bufsize=0,
+                                        start_new_session=True)  # not interrupted along with the slideshow
+
+    def wait_ready(self, timeout=START_TIMEOUT):
+        """Wait for the child to have started; returns False if it didn't."""
+        message = self._receive(time.monotonic() + timeout)
+        return message is not None and message.get('ready', False)
+
+    def push(self, line, write):
+        """Run a line of interactive input, as InteractiveConsole.push(); returns whether more input is needed."""
+        return self._call({'push': line}, write)
+
+    def runcode(self, code, write):
+        """Run a code object."""
+        self._call({'run': base64.b64encode(marshal.dumps(code)).decode('ascii')}, write)
+
+    def interrupt(self):
+        """Raise KeyboardInterrupt in the running command (as Ctrl-C would)."""
+        if self.busy and self.process.poll() is None:
+            os.kill(self.process.pid, signal.SIGINT)
+
+    def close(self):
+        self.closed = True
+        if self.process.poll() is None:
+            self.process.kill()
+            self.process.wait()
+
+    def _call(self, command, write):
+        if self.closed:
+            return False
+
+        if self.process.poll() is not None:
+            self._restart(write, 'the sandbox process had exited')
+
+        command['cpu_limit'] = self.cpu_limit
+        self.busy = True
+        try:
+            self.process.stdin.write((json.dumps(command) + '\n').encode('utf8'))
+            deadline = time.monotonic() + self.timeout if self.timeout else None
+            interrupted = False
+            while True:
+                message = self._receive(deadline)
+                if message is None:
+                    if self.closed:
+                        return False
+                    if deadline is not None and time.monotonic() >= deadline and not interrupted:
+                        self.interrupt()
+                        interrupted = True
+                        deadline = time.monotonic() + INTERRUPT_GRACE
+                        continue
+                    self._restart(write, 'the command timed out' if interrupted else 'the sandbox process exited')
+                    return False
+                if 'out' in message:
+                    write(message['out'])
+                elif 'done' in message:
+                    return message['done']
+        except OSError:
+            self._restart(write, 'the sandbox process exited')
+            return False
+        finally:
+            self.busy = False
+
+    def _restart(self, write, reason):
+        if self.closed:
+            return
+        write('\n[%s; restarting it, previous variables are lost]\n' % reason)
+        if self.process.poll() is None:
+            self.process.kill()
+        self.process.wait()
+        self._start()
+        if not self.wait_ready():
+            Logger.error('Sandbox: The sandbox process didn\'t start')
+
+    def _receive(self, deadline):
+        """The next message from the child, or None on a timeout or if it exited."""
+        fd = self.process.stdout.fileno()
+        while b'\n' not in self._buffer:
+            remaining = None if deadline is None else deadline - time.monotonic()
+            if remaining is not None and remaining <= 0:
+                return None
+            readable, _, _ = select.select([fd], [], [], remaining)
+            if not readable:
+                return None
+            data = os.read(fd, 64 * 1024)
+            if not data:
+                return None
+            self._buffer += data
+        line, self._buffer = self._buffer.split(b'\n', 1)
+        return json.loads(line)
+
+
+_spares = {}  # (memory limit) -> Sandbox started ahead of time
+_spares_lock = threading.Lock()
+
+
+def _start_spare(memory_limit):
+    sandbox = Sandbox(memory_limit=memory_limit)
+    with _spares_lock:
+        if memory_limit in _spares:
+            sandbox.close()
+        else:
+            _spares[memory_limit] = sandbox
+
+
+def prestart(memory_limit=MEMORY_LIMIT):
+    """Start a spare sandbox process in the background, so that the next take() doesn't wait for one to start."""
+    with _spares_lock:
+        if memory_limit in _spares:
+            return
+    threading.Thread(target=_start_spare, args=(memory_limit,), daemon=True).start()
+
+
+def take(cpu_limit=CPU_LIMIT, memory_limit=MEMORY_LIMIT, timeout=None):
+    """Return a sandbox, using the spare one if there is one (and starting another spare to replace it)."""
+    with _spares_lock:
+        sandbox = _spares.pop(memory_limit, None)
+    if sandbox is None or sandbox.process.poll() is not None:
+        sandbox = Sandbox(memory_limit=memory_limit)
+    prestart(memory_limit)
+
+    sandbox.cpu_limit = cpu_limit
+    sandbox.timeout = timeout
+    return sandbox
@@ -0,0 +1,122 @@
+"""The child process of a Sandbox.
+
+Reads commands, one JSON object per line, on stdin, runs them in an InteractiveConsole and answers on stdout: an
+{"out": text} line for each piece of output, then {"done": more} (see Sandbox for the other side). It is run as
+a script and only uses the standard library, so that it starts quickly and without a window.
+"""
+import base64
+import code
+import json
+import marshal
+import os
+import resource
+import signal
+import sys
+
+
+class CPUTimeExceeded(Exception):
+    pass
+
+
+class Channel(object):
+
+    def __init__(self, stream):
+        self.stream = stream
+
+    def send(self, **message):
+        try:
+            self.stream.write(json.dumps(message) + '\n')
+            self.stream.flush()
+        except BrokenPipeError:  # the slideshow has gone
+            os._exit(0)
+
+
+class ChannelWriter(object):
+
+    def __init__(self, channel):
+        self.channel = channel
+
+    def write(self, s):
+        if s:
+            self.channel.send(out=s)
+        return len(s)
+
+    def writelines(self, lines):
+        for line in lines:
+            self.write(line)
+
+    def flush(self):
+        pass
+
+    def isatty(self):
+        return True
+
+
+def on_cpu_time_exceeded(signum, frame):
+    raise CPUTimeExceeded('the command used more CPU time than the sandbox allows')
+
+
+def limit_cpu_time(seconds):
+    """Allow the next command seconds of CPU time (RLIMIT_CPU counts the whole process, so it is moved on)."""
+    _, hard = resource.getrlimit(resource.RLIMIT_CPU)
+    if seconds:
+        usage = resource.getrusage(resource.RUSAGE_SELF)
+        soft = int(usage.ru_utime + usage.ru_stime + seconds) + 1
+        if hard != resource.RLIM_INFINITY:
+            soft = min(soft, hard)
+    else:
+        soft = hard
+    resource.setrlimit(resource.RLIMIT_CPU, (soft, hard))
+
+
+def main():
+    memory_limit = int(sys.argv[1])
+
+    # answers go over the original stdout; anything else that writes to file descriptor 1 is discarded
+    channel = Channel(os.fdopen(os.dup(1), 'w', encoding='utf8'))
+    devnull = os.open(os.devnull, os.O_RDWR)
+    os.dup2(devnull, 1)
+    commands = os.fdopen(os.dup(0), 'r', encoding='utf8')
+    os.dup2(devnull, 0)
+
+    writer = ChannelWriter(channel)
+    sys.stdout = sys.stderr = writer
+    sys.stdin = open(os.devnull)
+
+    if memory_limit:
+        resource.setrlimit(resource.RLIMIT_AS, (memory_limit, memory_limit))
+    signal.signal(signal.SIGXCPU, on_cpu_time_exceeded)
+
+    console = code.InteractiveConsole()
+    channel.send(ready=True)
+
+    while True:
+        try:
+            line = commands.readline()
+        except KeyboardInterrupt:  # arrived just after a command finished
+            continue
+        if not line:
+            break
+
+        command = json.loads(line)
+        more = False
+        try:
+            limit_cpu_time(command.get('cpu_limit'))
+            if 'push' in command:
+                more = console.push(command['push'])
+            else:
+                console.runcode(marshal.loads(base64.b64decode(command['run'])))
+        except KeyboardInterrupt:
+            writer.write('\nKeyboardInterrupt\n')
+            console.resetbuffer()
+        except SystemExit as e:
+            writer.write('SystemExit: %s\n' % e)
+            console.resetbuffer()
+        finally:
+            limit_cpu_time(None)
+        channel.send(done=bool(more))
+    os._exit(0)  # without flushing the channel, which may be closed by now
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+import re
+
+# CSI and OSC sequences and other escapes, none of which a dumb terminal acts on
+ESCAPE_SEQUENCE = re.compile(r'\x1b(\[[0-?]*[ -/]*[@-~]|\][^\x07\x1b]*(\x07|\x1b\\)?|[@-Z\\-_])')
+# the start of an escape sequence that is cut off at the end of the output fed so far
+PARTIAL_ESCAPE = re.compile(r'\x1b(\[[0-?]*[ -/]*|\][^\x07\x1b]*\x1b?)?$')
+MAX_PARTIAL_ESCAPE = 4096  # characters held back waiting for the end of an escape sequence
+CONTROL = re.compile(r'([\x00-\x09\x0b-\x1f\x7f])')
+
+TAB_SIZE = 8
+
+
+class ScreenBuffer(object):
+    """The lines of a terminal, with a bounded scrollback.
+
+    Output is fed in as it arrives; carriage returns and backspaces overwrite, and escape sequences are dropped
+    (one split across feeds is held back until the rest of it arrives). Lines are addressed by an absolute index
+    that stays the same when old lines are dropped from the scrollback (lines before ``first_line`` are gone). The
+    indices of lines changed since the last take_dirty() are collected, so that a view only needs to redraw those.
+    Wrapping lines to the width of the view is left to the view, so that they can be wrapped again when it is
+    resized.
+    """
+
+    def __init__(self, max_lines=10000):
+        self.max_lines = max_lines
+        self.lines = ['']
+        self.first_line = 0
+        self.cursor_col = 0
+        self._dirty = {0}
+        self._partial = ''  # the start of an escape sequence, from the end of the last feed
+
+    @property
+    def end_line(self):
+        return self.first_line + len(self.lines)
+
+    def __getitem__(self, index):
+        return self.lines[index - self.first_line]
+
+    def mark_dirty(self, index):
+        self._dirty.add(index)
+
+    def take_dirty(self):
+        dirty, self._dirty = self._dirty, set()
+        return dirty
+
+    def feed(self, text):
+        text = self._partial + text
+        partial = PARTIAL_ESCAPE.search(text)
+        if partial is not None and len(text) - partial.start() <= MAX_PARTIAL_ESCAPE:
+            text, self._partial = text[:partial.start()], text[partial.start():]
+        else:
+            self._partial = ''
+        text = ESCAPE_SEQUENCE.sub('', text)
+        for i, line in enumerate(text.split('\n')):
+            if i:
+                self._newline()
+            if CONTROL.search(line) is None:
+                self._put(line)
+                continue
+            for part in CONTROL.split(line):
+                if part == '\r':
+                    self.cursor_col = 0
+                elif part == '\b':
+                    self.cursor_col = max(self.cursor_col - 1, 0)
+                elif part == '\t':
+                    self._put(' ' * (TAB_SIZE - self.cursor_col % TAB_SIZE))
+                elif part and not CONTROL.match(part):
+                    self._put(part)
+        self._trim()
+
+    def _put(self, text):
+        if not text:
+            return
+        col = self.cursor_col
+        line = self.lines[-1]
+        if col == len(line):
+            line += text
+        else:
+            line = line[:col].ljust(col) + text + line[col + len(text):]
+        self.lines[-1] = line
+        self.cursor_col = col + len(text)
+        self._dirty.add(self.end_line - 1)
+
+    def _newline(self):
+        self.lines.append('')
+        self.cursor_col = 0
+        self._dirty.add(self.end_line - 1)
+
+    def _trim(self):
+        # in batches, so that the cost of shifting the list is amortised
+        if 0 < self.max_lines < len(self.lines) * 0.8:
+            excess = len(self.lines) - self.max_lines
+            del self.lines[:excess]
+            self.first_line += excess
+            self._dirty = {index for index in self._dirty if index >= self.first_line}
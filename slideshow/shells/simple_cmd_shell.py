@@ -1,4 +1,4 @@
-import os
+import codecs
 import os
 import shlex
 import subprocess
@@ -10,14 +10,19 @@ from kivy.clock import mainthread
 from kivy.event import EventDispatcher
 from kivy.lang import Builder
 from kivy.properties import ObjectProperty, ListProperty, StringProperty, \
-    NumericProperty, Clock, partial
+    NumericProperty, BooleanProperty, Clock, partial
 from kivy.uix.boxlayout import BoxLayout
 from kivy.uix.textinput import TextInput
 
+from . import pty_shell
+from .output import OutputBuffer, ScrollbackBehavior
+
+READ_SIZE = 64 * 1024
+
 # TODO:
-#  support for terminal emulation using pyte - requires rethinking the gui a bit and customising scrolling
-#       (basically a fixed size text area, custom scroll bars and touch events & call into pyte for the data)
-#  support for interactive sessions (requires terminal emulation and opening a persistent process [like bash])
+#  full terminal emulation (cursor movement, colours, the alternate screen...), e.g. with pyte feeding the
+#       ScreenBuffer of TerminalConsole, which so far only handles \r, \b and tabs and drops escape sequences
+#  support for interactive programs in persistent sessions (requires full terminal emulation)
 #  history (maybe we get that for free with an actual shell?!)
 
 
@@ -34,12 +39,34 @@ Builder.load_string('''
             size_hint: (1, None)
             font_name: root.font_name
             font_size: root.font_size
+            scrollback_lines: root.scrollback_lines
             foreground_color: root.foreground_color
             background_color: root.background_color
             height: max(self.parent.height, self.minimum_height)
 ''')
 
 
+def user_and_host():
+    hostname = 'kivy'
+    try:
+        if hasattr(os, 'uname'):
+            hostname = os.uname()[1]
+        else:
+            hostname = os.environ.get('COMPUTERNAME', 'kivy')
+    except Exception:
+        pass
+    username = os.environ.get('USER', '')
+    if not username:
+        username = os.environ.get('USERNAME', 'designer')
+    return username, hostname
+
+
+def format_prompt(username, hostname, cur_dir):
+    '''The PS1 shown by the consoles
+    '''
+    return "[%s@%s %s]> " % (username, hostname, os.path.basename(str(cur_dir)))
+
+
 def threaded(fn):
     def wrapper(*args, **kwargs):
         th = threading.Thread(target=fn, args=args, kwargs=kwargs)
@@ -56,31 +83,127 @@ class Shell(EventDispatcher):
     '''subprocess process
     '''
 
+    persistent = BooleanProperty(False)
+    '''Run commands in one long-lived shell on a pseudo terminal, rather than a new process per command, so
+    that the working directory and environment carry over between commands. Ignored where pseudo terminals
+    aren't available (Windows).
+    '''
+
+    shell_command = ListProperty(['/bin/sh', '+m'])
+    '''The shell started for a persistent session (+m: without job control, which needs a controlling terminal)
+    '''
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.session = None
+        self.cwd = None  # working directory of the persistent session
+        self._session_output = None
+        self._session_show_output = True
+        self._session_busy = False
+
+    def run_command(self, command, show_output=True, keep_output=True, *args):
+        """Run command (a list of arguments, or in a persistent session also a command line), dispatching
+        on_output with chunks of its output as they arrive and on_complete once it has finished.
+
+        on_complete is passed the whole output, unless keep_output is False, in which case it is passed an empty
+        string and the output isn't accumulated (so memory stays bounded however much the command prints).
+        """
+        if self.persistent and pty_shell.available():
+            if not isinstance(command, str):
+                command = shlex.join(command)
+            self._run_in_session(command, show_output, keep_output)
+        else:
+            self._run_process(command, show_output, keep_output)
+
+    def run_command_line(self, command_line):
+        """Run a command line typed into a console, showing but not accumulating its output."""
+        if self.persistent and pty_shell.available():
+            # the shell parses the command line itself
+            self.run_command(str(command_line), keep_output=False)
+            return
+
+        commands = shlex.split(str(command_line), posix=sys.platform[0] != 'w')
+        self.run_command(commands, keep_output=False)
+
+    def open_session(self):
+        """Start the persistent shell, if it isn't running already."""
+        if self.session is None or not self.session.alive:
+            self.session = pty_shell.PtyShell(self.shell_command, self._on_session_output,
+                                              self._on_session_complete, cwd=self.cwd)
+            self.cwd = self.session.cwd
+
+    def close_session(self):
+        if self.session is not None:
+            self.session.close()
+            self.session = None
+
+    def _run_in_session(self, command_line, show_output, keep_output):
+        self._session_output = [] if keep_output else None
+        self._session_show_output = show_output
+        self._session_busy = True
+        try:
+            self.open_session()
+        except Exception as e:
+            self._on_session_output(str(e) + "\n")
+            self._on_session_complete(None, None)
+            return
+        self.session.run(command_line)
+
+    def _on_session_output(self, chunk):
+        # called on the session's reader thread
+        if self._session_output is not None:
+            self._session_output.append(chunk)
+        if self._session_show_output:
+            self.dispatch('on_output', chunk)
+
+    def _on_session_complete(self, status, cwd):
+        # called on the session's reader thread; status is None if the shell has exited
+        if cwd is not None:
+            self.cwd = cwd
+        if self._session_busy:
+            self._session_busy = False
+            output = ''.join(self._session_output) if self._session_output is not None else ''
+            self._session_output = None
+            self.dispatch('on_complete', output)
+
     @threaded
-    def run_command(self, command, show_output=True, *args):
-        output = ''
+    def _run_process(self, command, show_output, keep_output):
+        output = []
+        decoder = codecs.getincrementaldecoder('utf8')(errors='replace')
         try:
             self.process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
-            for line in iter(self.process.stdout.readline, b""):
-                line = line.decode("utf8")
-                output += line
-                if show_output:
-                    self.dispatch('on_output', line)
+            fd = self.process.stdout.fileno()
+            while True:
+                # returns whatever is available (up to READ_SIZE) rather than waiting for a whole line
+                data = os.read(fd, READ_SIZE)
+                chunk = decoder.decode(data, final=not data)
+                if chunk:
+                    if keep_output:
+                        output.append(chunk)
+                    if show_output:
+                        self.dispatch('on_output', chunk)
+                if not data:
+                    break
+            self.process.stdout.close()
+            self.process.wait()
         except Exception as e:
             line = str(e) + "\n"
-            output += line
+            if keep_output:
+                output.append(line)
             if show_output:
                 self.dispatch('on_output', line)
         finally:
-            self.dispatch('on_complete', output)
+            self.dispatch('on_complete', ''.join(output))
 
     @threaded
     def stop(self, *args):
-        if self.process:
+        if self.session is not None and self._session_busy:
+            self.session.interrupt()
+        elif self.process:
             self.process.kill()
 
 
-class ShellConsoleInput(TextInput):
+class ShellConsoleInput(ScrollbackBehavior, TextInput):
     '''Displays Output and sends input to Shell. Emits 'on_ready_to_input'
        when it is ready to get input from user.
     '''
@@ -92,23 +215,16 @@ class ShellConsoleInput(TextInput):
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
         self._cursor_pos = 0  # position of the cursor before after prompt
+        # output arrives from the command's thread; it is shown once per frame, however many chunks there are
+        self.output = OutputBuffer(self._show_output, max_lines=self.scrollback_lines)
+        self.bind(scrollback_lines=self._set_output_max_lines)
         self.__init_console()
 
     def __init_console(self, *args):
         '''Create initial values for the prompt and shows it
         '''
         self.cur_dir = os.getcwd()
-        self._hostname = 'kivy'
-        try:
-            if hasattr(os, 'uname'):
-                self._hostname = os.uname()[1]
-            else:
-                self._hostname = os.environ.get('COMPUTERNAME', 'kivy')
-        except Exception:
-            pass
-        self._username = os.environ.get('USER', '')
-        if not self._username:
-            self._username = os.environ.get('USERNAME', 'designer')
+        self._username, self._hostname = user_and_host()
         self.prompt()
 
     def keyboard_on_key_down(self, window, keycode, text, modifiers):
@@ -136,12 +252,7 @@ class ShellConsoleInput(TextInput):
             window, keycode, text, modifiers)
 
     def _run_cmd(self, cmd, *args):
-        _posix = True
-        if sys.platform[0] == 'w':
-            _posix = False
-
-        commands = shlex.split(str(cmd), posix=_posix)
-        self.shell.run_command(commands)
+        self.shell.run_command_line(cmd)
 
     def validate_cursor_pos(self, *args):
         if self.cursor_index() < self._cursor_pos:
@@ -151,17 +262,23 @@ class ShellConsoleInput(TextInput):
     def prompt(self, *args):
         '''Show the PS1 variable
         '''
-        ps1 = "[%s@%s %s]> " % (
-            self._username, self._hostname,
-            os.path.basename(str(self.cur_dir)))
-        self._cursor_pos = self.cursor_index() + len(ps1)
-        self.text += ps1
+        ps1 = format_prompt(self._username, self._hostname, self.cur_dir)
+        self.output.flush()  # the prompt goes after any output that is still pending
+        self._show_output(ps1)
+        self._cursor_pos = len(self.text)
 
-    @mainthread
     def on_output(self, output):
-        self.text += output
+        self.output.write(output)
+
+    def _show_output(self, output):
+        removed = self.append_output(output)
+        self._cursor_pos = max(self._cursor_pos - removed, 0)
+
+    def _set_output_max_lines(self, instance, value):
+        self.output.max_lines = int(value)
 
     def on_complete(self, output):
+        self.cur_dir = self.shell.cwd or self.cur_dir
         self.prompt()
 
 
@@ -203,6 +320,13 @@ class ShellConsole(BoxLayout, Shell):
     Default to '9'
     '''
 
+    scrollback_lines = NumericProperty(10000)
+    '''Maximum number of lines kept in the console; older lines are trimmed (0 keeps everything)
+
+    :data:`scrollback_lines` is a :class:`~kivy.properties.NumericProperty`,
+    Default to 10000
+    '''
+
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
 
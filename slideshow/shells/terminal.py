@@ -0,0 +1,292 @@
+import os
+
+from kivy.base import runTouchApp
+from kivy.clock import Clock, mainthread
+from kivy.core.text import Label as CoreLabel
+from kivy.graphics import Color, InstructionGroup, Rectangle
+from kivy.properties import ListProperty, StringProperty, NumericProperty
+from kivy.uix.behaviors import FocusBehavior
+from kivy.uix.widget import Widget
+
+from .output import OutputBuffer
+from .screen import ScreenBuffer
+from .simple_cmd_shell import Shell, format_prompt, user_and_host
+
+PADDING = 4
+SCROLL_ROWS = 3
+
+
+class TerminalView(FocusBehavior, Widget):
+    '''A fixed-size terminal showing the lines of a ScreenBuffer, wrapped to its width, with a line of input at
+    the end of the last line.
+
+    Only the rows on screen are drawn, one texture per row, and a row is only rendered again when it changes or
+    scrolls into view, so the cost of drawing doesn't depend on how much output there has been. Emits
+    'on_command' with the input line when enter is pressed and 'on_interrupt' for ctrl-c.
+    '''
+    __events__ = ('on_command', 'on_interrupt')
+
+    foreground_color = ListProperty((0, 0, 0, 1))
+    '''This defines the color of the text in the console
+    '''
+
+    background_color = ListProperty((1, 1, 1, 1))
+    '''This defines the background color of the console
+    '''
+
+    font_name = StringProperty('RobotoMono-regular')
+    '''Indicates the font Style used in the console; must be monospaced
+    '''
+
+    font_size = NumericProperty("14sp")
+    '''Indicates the size of the font used for the console
+    '''
+
+    scrollback_lines = NumericProperty(10000)
+    '''Maximum number of lines kept; older lines are dropped (0 keeps everything)
+    '''
+
+    scroll_offset = NumericProperty(0)
+    '''Number of rows the view is scrolled up from the bottom
+    '''
+
+    def __init__(self, **kwargs):
+        self.screen = ScreenBuffer()
+        self.input_line = ''
+        self.columns = 1
+        self._char_size = (1, 1)
+        self._row_rects = []
+        self._textures = {}  # (line index, row within the line) -> texture, for the rows on screen
+        self.redraw_trigger = Clock.create_trigger(self.redraw)
+        super().__init__(**kwargs)
+
+        with self.canvas:
+            self._background_color = Color(rgba=self.background_color)
+            self._background = Rectangle()
+            Color(1, 1, 1, 1)  # the rows are rendered in the foreground colour
+            self._rows = InstructionGroup()
+            self._cursor_color = Color(rgba=self.foreground_color)
+            self._cursor = Rectangle(size=(0, 0))
+
+        self.bind(pos=self._layout, size=self._layout, scroll_offset=self.redraw_trigger, focus=self.redraw_trigger,
+                  font_name=self._restyle, font_size=self._restyle, foreground_color=self._restyle,
+                  background_color=self._set_background_color,
+                  scrollback_lines=self._set_max_rows)
+        self._set_max_rows(self, self.scrollback_lines)
+        self._restyle()
+
+    @property
+    def visible_rows(self):
+        return len(self._row_rects)
+
+    def feed(self, text):
+        '''Add output to the screen (on the main thread)
+        '''
+        self.screen.feed(text)
+        self.redraw_trigger()
+
+    def scroll_by(self, rows):
+        self.scroll_offset = max(self.scroll_offset + rows, 0)  # limited to the scrollback when redrawn
+
+    def _set_background_color(self, instance, value):
+        self._background_color.rgba = value
+
+    def _set_max_rows(self, instance, value):
+        self.screen.max_lines = int(value)
+
+    def _restyle(self, *args):
+        label = CoreLabel(text='M', font_name=self.font_name, font_size=self.font_size)
+        label.refresh()
+        self._char_size = label.texture.size
+        self._cursor_color.rgba = self.foreground_color
+        self._textures = {}
+        self._layout()
+
+    def _layout(self, *args):
+        char_width, row_height = self._char_size
+        columns = max(int((self.width - 2 * PADDING) / char_width), 1)
+        rows = max(int((self.height - 2 * PADDING) / row_height), 1)
+        if columns != self.columns:
+            self.columns = columns
+            self._textures = {}  # the lines wrap differently
+
+        self._background.pos = self.pos
+        self._background.size = self.size
+        if rows != len(self._row_rects):
+            self._rows.clear()
+            self._row_rects = [Rectangle(size=(0, 0)) for _ in range(rows)]
+            for rect in self._row_rects:
+                self._rows.add(rect)
+        self.redraw_trigger()
+
+    def _line_text(self, index):
+        text = self.screen[index]
+        if index == self.screen.end_line - 1:
+            text += self.input_line
+        return text
+
+    def _row_count(self, index):
+        return max(-(-len(self._line_text(index)) // self.columns), 1)
+
+    def _rows_on_screen(self):
+        """The (line index, row within the line) of the rows on screen, from the top down.
+
+        Only the lines that are on screen, or between the screen and the end, are looked at.
+        """
+        screen = self.screen
+        wanted = self.visible_rows + int(self.scroll_offset)
+        rows = []
+        index = screen.end_line - 1
+        while index >= screen.first_line and len(rows) < wanted:
+            rows.extend((index, k) for k in reversed(range(self._row_count(index))))
+            index -= 1
+        rows.reverse()
+
+        offset = min(int(self.scroll_offset), max(len(rows) - self.visible_rows, 0))
+        if offset != self.scroll_offset:
+            self.scroll_offset = offset
+        return rows[max(len(rows) - offset - self.visible_rows, 0):len(rows) - offset]
+
+    def _render(self, text):
+        if not text.strip():
+            return None
+        label = CoreLabel(text=text, font_name=self.font_name, font_size=self.font_size,
+                          color=self.foreground_color)
+        label.refresh()
+        return label.texture
+
+    def redraw(self, *args):
+        dirty = self.screen.take_dirty()
+        char_width, row_height = self._char_size
+        rows = self._rows_on_screen()
+        last_line = self.screen.end_line - 1
+
+        textures = {}
+        cursor = None
+        for i, rect in enumerate(self._row_rects):
+            texture = None
+            if i < len(rows):
+                index, k = row = rows[i]
+                if row in self._textures and index not in dirty:
+                    texture = self._textures[row]
+                else:
+                    texture = self._render(self._line_text(index)[k * self.columns:(k + 1) * self.columns])
+                textures[row] = texture
+                if index == last_line and k == self._row_count(index) - 1:
+                    cursor = i, len(self._line_text(index)) - k * self.columns
+            rect.texture = texture
+            rect.size = texture.size if texture is not None else (0, 0)
+            rect.pos = (self.x + PADDING, self.top - PADDING - (i + 1) * row_height)
+        self._textures = textures  # rows scrolled off screen are forgotten
+
+        if self.focus and cursor is not None:
+            i, column = cursor
+            self._cursor.pos = (self.x + PADDING + column * char_width, self.top - PADDING - (i + 1) * row_height)
+            self._cursor.size = (max(char_width / 6, 1), row_height)
+        else:
+            self._cursor.size = (0, 0)
+
+    def _input_changed(self):
+        self.screen.mark_dirty(self.screen.end_line - 1)
+        self.scroll_offset = 0
+        self.redraw_trigger()
+
+    def keyboard_on_textinput(self, window, text):
+        self.input_line += text
+        self._input_changed()
+
+    def keyboard_on_key_down(self, window, keycode, text, modifiers):
+        key = keycode[1]
+        if key in ('enter', 'numpadenter'):
+            line, self.input_line = self.input_line, ''
+            self.feed(line + '\n')
+            self.scroll_offset = 0
+            self.dispatch('on_command', line)
+        elif key == 'backspace':
+            self.input_line = self.input_line[:-1]
+            self._input_changed()
+        elif key == 'c' and modifiers == ['ctrl']:
+            self.dispatch('on_interrupt')
+        elif key == 'pageup':
+            self.scroll_by(self.visible_rows)
+        elif key == 'pagedown':
+            self.scroll_by(-self.visible_rows)
+        elif key in ('tab', 'escape'):
+            return super().keyboard_on_key_down(window, keycode, text, modifiers)
+        return True
+
+    def on_touch_down(self, touch):
+        if self.collide_point(*touch.pos) and touch.is_mouse_scrolling:
+            self.scroll_by(SCROLL_ROWS if touch.button == 'scrolldown' else -SCROLL_ROWS)
+            return True
+        if self.collide_point(*touch.pos):
+            touch.grab(self)
+            touch.ud['terminal_scroll'] = 0
+        return super().on_touch_down(touch)
+
+    def on_touch_move(self, touch):
+        if touch.grab_current is self:
+            touch.ud['terminal_scroll'] += touch.dy / self._char_size[1]
+            rows = int(touch.ud['terminal_scroll'])
+            if rows:
+                touch.ud['terminal_scroll'] -= rows
+                self.scroll_by(rows)
+            return True
+        return super().on_touch_move(touch)
+
+    def on_touch_up(self, touch):
+        if touch.grab_current is self:
+            touch.ungrab(self)
+            return True
+        return super().on_touch_up(touch)
+
+    def on_command(self, line):
+        pass
+
+    def on_interrupt(self):
+        pass
+
+
+class TerminalConsole(TerminalView, Shell):
+    '''A console like ShellConsole, drawn with a TerminalView rather than a TextInput
+    '''
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        # output arrives from the command's thread; it is shown once per frame, however many chunks there are
+        self.output = OutputBuffer(self.feed, max_lines=self.scrollback_lines)
+        self.bind(scrollback_lines=self._set_output_max_lines)
+
+        self.cur_dir = os.getcwd()
+        self._username, self._hostname = user_and_host()
+        self.prompt()
+
+    def _set_output_max_lines(self, instance, value):
+        self.output.max_lines = int(value)
+
+    @mainthread
+    def prompt(self, *args):
+        '''Show the PS1 variable
+        '''
+        self.output.flush()  # the prompt goes after any output that is still pending
+        self.feed(format_prompt(self._username, self._hostname, self.cur_dir))
+
+    def on_command(self, line):
+        if line.strip():
+            self.run_command_line(line)
+        else:
+            self.prompt()
+
+    def on_interrupt(self):
+        self.stop()
+
+    def on_output(self, output):
+        self.output.write(output)
+
+    def on_complete(self, output):
+        self.cur_dir = self.cwd or self.cur_dir
+        self.prompt()
+
+
+if __name__ == '__main__':
+    runTouchApp(TerminalConsole())
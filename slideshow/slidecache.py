@@ -0,0 +1,67 @@
+from collections import OrderedDict
+
+
+class SlideCache:
+    """LRU of recently visited slides whose built widget trees are kept alive after the slide is left.
+
+    The cache is bounded by the number of retained slides and/or by the estimated texture memory they
+    hold. Evicted slides get the normal teardown (``close()`` and clearing of their widgets).
+    """
+
+    def __init__(self, max_slides=0, max_texture_bytes=None):
+        self.max_slides = max_slides
+        self.max_texture_bytes = max_texture_bytes
+        self._slides = OrderedDict()  # slide -> estimated texture bytes
+
+    @property
+    def enabled(self):
+        return self.max_slides > 0 or self.max_texture_bytes is not None
+
+    @property
+    def texture_bytes(self):
+        return sum(self._slides.values())
+
+    def __len__(self):
+        return len(self._slides)
+
+    def __contains__(self, slide):
+        return slide in self._slides
+
+    def touch(self, slide):
+        """Mark slide as the most recently used, retaining it if it is cacheable."""
+        if not self.enabled or not slide.cacheable:
+            return
+
+        slide.retained = True
+        self._slides[slide] = slide.estimate_texture_bytes()
+        self._slides.move_to_end(slide)
+        self._evict(keep=slide)
+
+    def discard(self, slide):
+        if self._slides.pop(slide, None) is not None:
+            self._release(slide)
+
+    def clear(self):
+        for slide in list(self._slides):
+            self.discard(slide)
+
+    def _over_budget(self):
+        if self.max_slides > 0 and len(self._slides) > self.max_slides:
+            return True
+        if self.max_texture_bytes is not None and self.texture_bytes > self.max_texture_bytes:
+            return True
+        return False
+
+    def _evict(self, keep):
+        while self._over_budget():
+            oldest = next(iter(self._slides))
+            if oldest is keep:
+                break
+            self.discard(oldest)
+
+    @staticmethod
+    def _release(slide):
+        slide.retained = False
+        if slide.manager is None and slide.built:
+            # already off screen; otherwise on_leave will tear it down
+            slide.teardown()
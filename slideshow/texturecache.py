@@ -0,0 +1,135 @@
+import os
+import threading
+from collections import OrderedDict
+
+from PIL import Image
+from kivy.resources import resource_find
+
+BYTES_PER_PIXEL = {
+    'rgb': 3,
+    'bgr': 3,
+    'rgba': 4,
+    'bgra': 4,
+    'luminance': 1,
+    'luminance_alpha': 2,
+}
+
+
+def texture_nbytes(texture):
+    return texture.width * texture.height * BYTES_PER_PIXEL.get(texture.colorfmt, 4)
+
+
+class _Entry:
+    def __init__(self, texture, image):
+        self.texture = texture
+        self.image = image  # keeps PIL images alive so that their id() can't be reused
+        self.nbytes = texture_nbytes(texture)
+        self.refs = 0
+
+
+class TextureCache:
+    """Process-wide cache of decoded image textures.
+
+    Images given as file paths are keyed by path and modification time, and PIL images by identity (so a PIL
+    image must not be modified after it has been shown); other sources, such as atlas:// urls, are keyed by the
+    source string. Textures are reference counted with acquire() and
+    release(); textures that are no longer referenced are kept, and evicted least recently used first once
+    the cache holds more than ``max_bytes``.
+    """
+
+    def __init__(self, loader, max_bytes=512 * 1024 * 1024):
+        self.loader = loader
+        self.max_bytes = max_bytes
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self._lock = threading.RLock()
+        self._entries = OrderedDict()  # key -> _Entry
+        self._keys = {}  # id(texture) -> key
+
+    @staticmethod
+    def key_for(image):
+        if isinstance(image, Image.Image):
+            return 'pil', id(image)
+        path = os.path.abspath(resource_find(image) or image)
+        try:
+            return 'file', path, os.stat(path).st_mtime_ns
+        except OSError:
+            # not a file (e.g. atlas://), or a missing one, whose load fails just as it would without the cache
+            return 'source', image
+
+    @property
+    def nbytes(self):
+        with self._lock:
+            return sum(entry.nbytes for entry in self._entries.values())
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, image):
+        key = self.key_for(image)
+        with self._lock:
+            return key in self._entries
+
+    def acquire(self, image, decoded=None):
+        """Return the texture for image, loading it on a miss, and take a reference to it.
+
+        ``decoded`` may be given the already decoded PIL image (e.g. from a prefetch) to avoid decoding
+        again on a miss. Must be called on the main thread.
+        """
+        key = self.key_for(image)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                entry = _Entry(self.loader(image if decoded is None else decoded), image)
+                self._entries[key] = entry
+                self._keys[id(entry.texture)] = key
+            else:
+                self.hits += 1
+                self._entries.move_to_end(key)
+            entry.refs += 1
+            self._evict()
+            return entry.texture
+
+    def release(self, texture):
+        with self._lock:
+            key = self._keys.get(id(texture))
+            if key is None:
+                return
+            entry = self._entries[key]
+            entry.refs = max(entry.refs - 1, 0)
+            self._evict()
+
+    def clear(self):
+        """Drop every unreferenced texture."""
+        with self._lock:
+            for key in [key for key, entry in self._entries.items() if entry.refs == 0]:
+                self._remove(key)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'entries': len(self._entries),
+                'bytes': self.nbytes,
+            }
+
+    def _evict(self):
+        total = self.nbytes
+        for key in list(self._entries):
+            if total <= self.max_bytes:
+                break
+            entry = self._entries[key]
+            if entry.refs == 0:
+                total -= entry.nbytes
+                self._remove(key)
+                self.evictions += 1
+
+    def _remove(self, key):
+        entry = self._entries.pop(key)
+        del self._keys[id(entry.texture)]
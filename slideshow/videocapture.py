@@ -1,156 +1,719 @@
+import itertools
+import multiprocessing
+import os
 import threading
+import time
+import traceback
 from collections import deque
+from multiprocessing import shared_memory
 
 import cv2
+import numpy as np
 from kivy import Logger
+from kivy.clock import Clock
 from kivy.core.camera.camera_opencv import CameraOpenCV
 from kivy.graphics.texture import Texture
 from kivy.lang import Builder
-from kivy.properties import ObjectProperty
+from kivy.properties import ObjectProperty, BooleanProperty, NumericProperty, OptionProperty
 from kivy.uix.camera import Camera
 from kivy.uix.floatlayout import FloatLayout
 
 from . import Slide
+from .instrumentation import instruments
 
 MAX_DEVICES = 10
+PROBE_TIMEOUT = 2  # seconds to wait for cameras to respond when listing devices
+FRAME_TIMEOUT = 0.1  # seconds a worker waits for a frame before re-checking whether it should stop
+LATENCY_WINDOW = 120  # number of recent frames the latency statistics are averaged over
+DISPLAY_FPS = 60  # how often the UI thread polls for a processed frame to display
+CAPTURE_TIMEOUT = 1  # seconds to wait for a blocked camera read when stopping
+CAMERA_STALL = 0.25  # seconds without a new frame to display that are recorded as a stall
+
+
+class FrameStats:
+    """Counters and per-stage latencies (in seconds) for the capture -> process -> display pipeline."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.captured = 0
+        self.processed = 0
+        self.dropped = 0
+        self.displayed = 0
+        self.uploaded_bytes = 0
+        self.latencies = {}
+        self._uploads = deque(maxlen=LATENCY_WINDOW)  # (time, bytes) of recent texture uploads
+
+    def count(self, name, n=1):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + n)
+
+    def record(self, stage, seconds):
+        with self._lock:
+            if stage not in self.latencies:
+                self.latencies[stage] = deque(maxlen=LATENCY_WINDOW)
+            self.latencies[stage].append(seconds)
+
+    def record_upload(self, nbytes):
+        with self._lock:
+            self.uploaded_bytes += nbytes
+            self._uploads.append((time.perf_counter(), nbytes))
+
+    def upload_rate(self):
+        """Bytes uploaded to the GPU per second, over the last second."""
+        with self._lock:
+            since = time.perf_counter() - 1
+            return sum(nbytes for t, nbytes in self._uploads if t >= since)
+
+    def mean_latency(self, stage):
+        with self._lock:
+            values = self.latencies.get(stage)
+            return sum(values) / len(values) if values else 0.
+
+    def snapshot(self):
+        upload_rate = self.upload_rate()
+        with self._lock:
+            return {
+                'captured': self.captured,
+                'processed': self.processed,
+                'dropped': self.dropped,
+                'displayed': self.displayed,
+                'uploaded_bytes': self.uploaded_bytes,
+                'upload_bytes_per_second': upload_rate,
+                'latency': {stage: sum(v) / len(v) for stage, v in self.latencies.items() if v},
+            }
+
+
+class FrameRing:
+    """A set of preallocated frame buffers, reused instead of allocating an array per frame.
+
+    acquire() hands out a free buffer, and release() returns it once its frame has left the pipeline (been dropped,
+    or processed and displayed), so a buffer is never overwritten while a worker or the display still reads it. If
+    every buffer is in use another one is added, so size is only the number to start with (see ring_size()).
+    """
+
+    def __init__(self, size):
+        self._buffers = [None] * size
+        self._free = list(range(size))
+        self._lock = threading.Lock()
+
+    def acquire(self, shape=None, dtype=None):
+        """Return (index, buffer) for a free slot, (re)allocating the buffer if shape and dtype are given and don't
+        match it. Without a shape the buffer may be None until one is stored with ring[index] = array."""
+        with self._lock:
+            if self._free:
+                index = self._free.pop()  # the most recently released buffer is the likeliest to still be cached
+            else:
+                index = len(self._buffers)
+                self._buffers.append(None)
+            buf = self._buffers[index]
+            if shape is not None and (buf is None or buf.shape != tuple(shape) or buf.dtype != dtype):
+                buf = self._buffers[index] = np.empty(shape, dtype)
+            return index, buf
+
+    def release(self, index):
+        with self._lock:
+            self._free.append(index)
+
+    def __getitem__(self, index):
+        return self._buffers[index]
+
+    def __setitem__(self, index, array):
+        self._buffers[index] = array
+
+
+def ring_size(workers):
+    # frames usually alive at once: one waiting for a worker, one per worker, up to one per worker waiting to be
+    # put in order, one waiting for display and one being uploaded
+    return 2 * workers + 3
+
+
+def release(leases):
+    """Return the ring buffers a frame is held in, given as (ring, index) pairs, to their rings."""
+    for ring, index in leases:
+        ring.release(index)
+
+
+def release_frame(item):
+    """Release the buffers of a frame handed through the pipeline, whose last element is its leases; used when
+    a frame is dropped or has been displayed."""
+    release(item[-1])
+
+
+def _holding(result, leases):
+    """Split leases into those whose buffer result uses (it may be, or be a view of, the buffer) and the rest."""
+    held, free = [], []
+    for lease in leases:
+        ring, index = lease
+        if result is not None and np.may_share_memory(result, ring[index]):
+            held.append(lease)
+        else:
+            free.append(lease)
+    return tuple(held), free
 
 
 class WorkerThread(threading.Thread):
 
-    def __init__(self, camera):
+    def __init__(self, pool):
         super().__init__()
-        self.camera = camera
+        self.pool = pool
+        self.camera = pool.camera
         self.daemon = True
         self.stop_event = threading.Event()
 
     def run(self):
+        stats = self.camera.stats
         while not self.stop_event.is_set():
             try:
-                frame = self.camera.frame_input.pop()
+                seq, frame, captured_at, leases = self.pool.take()
+            except IndexError:
+                continue  # no frame yet; check for stop and wait again
 
+            leases = list(leases)
+            start = time.perf_counter()
+            try:
                 if self.camera.processor is not None:
-                    frame = self.camera.processor(frame)
+                    frame = self.process(frame, leases)
+            except Exception:
+                Logger.exception('VideoCapture: Frame processor failed')
+                frame = None
+            stats.record('process', time.perf_counter() - start)
+            stats.count('processed')
+
+            # the input buffer can be reused as soon as the result no longer refers to it
+            held, done = _holding(frame, leases)
+            release(done)
+            self.pool.finish(seq, frame, captured_at, held)
+
+    def process(self, frame, leases):
+        """Return the processed frame; a ring buffer it is written into is added to leases."""
+        if self.camera.in_place:
+            out = self._output_buffer(frame.shape, frame.dtype, leases)
+            return self.camera.processor(frame, out=out)
+        return self.camera.processor(frame)
+
+    def _output_buffer(self, shape, dtype, leases):
+        ring = self.pool.output_ring
+        index, out = ring.acquire(shape, dtype)
+        leases.append((ring, index))
+        return out
+
+    def stop(self, timeout=FRAME_TIMEOUT * 2):
+        self.stop_event.set()
+        if self.is_alive() and self is not threading.current_thread():
+            self.join(timeout)
+
+
+def _attach(buffers, name):
+    if name not in buffers:
+        buffers[name] = shared_memory.SharedMemory(name=name)
+    return buffers[name]
+
+
+def _process_frames(processor, in_place, conn):
+    """Entry point of a process worker: runs processor over frames passed in through shared memory."""
+    buffers = {}
+    while True:
+        msg = conn.recv()
+        if msg is None:
+            break
+
+        in_name, out_name, out_size, shape, dtype = msg
+        for name in [name for name in buffers if name not in (in_name, out_name)]:
+            buffers.pop(name).close()  # the parent has replaced this buffer
+
+        conn.send(_process_frame(processor, in_place, buffers, in_name, out_name, out_size, shape, dtype))
+
+    for shm in buffers.values():
+        shm.close()
+
+
+def _process_frame(processor, in_place, buffers, in_name, out_name, out_size, shape, dtype):
+    # the views of the shared memory only live for this call: a buffer can't be closed while any are left
+    frame = np.ndarray(shape, dtype, buffer=_attach(buffers, in_name).buf)
+    try:
+        if in_place:
+            out = np.ndarray(shape, dtype, buffer=_attach(buffers, out_name).buf)
+            result = processor(frame, out=out)
+        else:
+            result = processor(frame)
+    except Exception:
+        return 'error', traceback.format_exc()
+
+    if result is None:
+        return 'none',
+
+    result = np.ascontiguousarray(result)
+    if in_place and result is out:
+        return 'shm', result.shape, result.dtype.str
+    if result.nbytes <= out_size:
+        np.ndarray(result.shape, result.dtype, buffer=_attach(buffers, out_name).buf)[...] = result
+        return 'shm', result.shape, result.dtype.str
+    # doesn't fit the output buffer; the parent will grow it for the next frame
+    return 'array', result
+
+
+def _ensure_buffer(shm, nbytes):
+    if shm is not None and shm.size >= nbytes:
+        return shm
+    if shm is not None:
+        shm.close()
+        shm.unlink()
+    return shared_memory.SharedMemory(create=True, size=max(nbytes, 1))
+
+
+CHILD_TIMEOUT = 1  # seconds a process worker is given to exit before it is terminated
+# the child has to import slideshow (and so kivy) to unpickle its target: stop it opening a window of its own
+CHILD_ENVIRON = {'KIVY_WINDOW': '', 'KIVY_NO_ARGS': '1', 'KIVY_NO_CONSOLELOG': '1'}
+_spawn_lock = threading.Lock()
+
+
+def _start_child(process):
+    with _spawn_lock:
+        saved = {key: os.environ.get(key) for key in CHILD_ENVIRON}
+        os.environ.update(CHILD_ENVIRON)
+        try:
+            process.start()
+        finally:
+            for key, value in saved.items():
+                if value is None:
+                    del os.environ[key]
+                else:
+                    os.environ[key] = value
+
+
+class ProcessWorkerThread(WorkerThread):
+    """Hands frames to a child process through a pair of shared memory buffers, rather than pickling them."""
+
+    def __init__(self, pool):
+        super().__init__(pool)
+        ctx = multiprocessing.get_context('spawn')  # don't fork the Kivy/GL process
+        self.conn, child_conn = ctx.Pipe()
+        self.child = ctx.Process(target=_process_frames, args=(self.camera.processor, self.camera.in_place, child_conn),
+                                 daemon=True)
+        self.in_buffer = None
+        self.out_buffer = None
 
-                self.camera.frame_output.append(frame)
-            except IndexError:
-                # drop frame
+    def run(self):
+        _start_child(self.child)
+        try:
+            super().run()
+        finally:
+            try:
+                self.conn.send(None)
+            except OSError:
                 pass
+            self.child.join(CHILD_TIMEOUT)
+            if self.child.is_alive():
+                self.child.terminate()
+            for shm in (self.in_buffer, self.out_buffer):
+                if shm is not None:
+                    shm.close()
+                    shm.unlink()
+
+    def stop(self, timeout=FRAME_TIMEOUT * 2 + CHILD_TIMEOUT):
+        # wait for the child to be shut down, so the shared memory is unlinked
+        super().stop(timeout)
+
+    def process(self, frame, leases):
+        frame = np.ascontiguousarray(frame)
+        self.in_buffer = _ensure_buffer(self.in_buffer, frame.nbytes)
+        self.out_buffer = _ensure_buffer(self.out_buffer, frame.nbytes)
+        np.ndarray(frame.shape, frame.dtype, buffer=self.in_buffer.buf)[...] = frame
+
+        self.conn.send((self.in_buffer.name, self.out_buffer.name, self.out_buffer.size, frame.shape,
+                        frame.dtype.str))
+        kind, *payload = self.conn.recv()
+
+        if kind == 'shm':
+            shape, dtype = payload
+            out = self._output_buffer(shape, dtype, leases)
+            np.copyto(out, np.ndarray(shape, dtype, buffer=self.out_buffer.buf))
+            return out
+        if kind == 'none':
+            return None
+        if kind == 'array':
+            self.out_buffer = _ensure_buffer(self.out_buffer, payload[0].nbytes)
+            return payload[0]
+        raise RuntimeError(payload[0])
+
+
+class ProcessorPool:
+    """Runs the camera's processor over frames on a pool of worker threads or processes.
+
+    Results are emitted to the camera's ``frame_output`` either in capture order (``ordering='ordered'``; a
+    finished frame waits for earlier frames that are still being processed) or as soon as they are ready
+    (``ordering='latest'``). Either way a frame older than the last one emitted is dropped, as is a frame for
+    which the processor returned None (nothing new to display). Process workers get frames through shared memory
+    rather than by pickling each ndarray, but need a picklable processor.
+
+    If the camera's ``in_place`` is set, the processor is called as ``processor(frame, out=buffer)`` with a
+    preallocated buffer of the frame's shape to write its result into (and return).
+    """
+
+    def __init__(self, camera, workers=1, worker_type='thread', ordering='ordered'):
+        if worker_type not in ('thread', 'process'):
+            raise ValueError("worker_type must be 'thread' or 'process'")
+        if ordering not in ('ordered', 'latest'):
+            raise ValueError("ordering must be 'ordered' or 'latest'")
+
+        self.camera = camera
+        self.ordering = ordering
+
+        self._take_lock = threading.Lock()
+        self._lock = threading.Lock()
+        self._in_flight = set()
+        self._results = {}
+        self._last_emitted = -1
+
+        if camera.processor is None:
+            workers, worker_type = 1, 'thread'  # nothing to parallelise
+        workers = max(int(workers), 1)
+        cls = ProcessWorkerThread if worker_type == 'process' else WorkerThread
+        self.workers = [cls(self) for _ in range(workers)]
+        self.output_ring = FrameRing(ring_size(workers))
+
+    def start(self):
+        for worker in self.workers:
+            worker.start()
+
+    def stop(self):
+        for worker in self.workers:
+            worker.stop_event.set()
+        for worker in self.workers:
+            worker.stop()
+
+    def take(self):
+        # pop and register under one lock, so the in-flight set always knows about older frames first
+        with self._take_lock:
+            seq, frame, captured_at, leases = self.camera.frame_input.pop(timeout=FRAME_TIMEOUT)
+            with self._lock:
+                self._in_flight.add(seq)
+            return seq, frame, captured_at, leases
+
+    def finish(self, seq, frame, captured_at, leases):
+        with self._lock:
+            self._in_flight.discard(seq)
+            if frame is not None:
+                self._results[seq] = (frame, captured_at, leases)
+            else:
+                release(leases)
+
+            if self.ordering == 'ordered' and self._in_flight:
+                oldest = min(self._in_flight)
+                ready = sorted(s for s in self._results if s < oldest)
+            else:
+                ready = sorted(self._results)
+
+            for s in ready:
+                frame, captured_at, leases = self._results.pop(s)
+                if s < self._last_emitted:
+                    self.camera.stats.count('dropped')
+                    release(leases)
+                    continue
+                self._last_emitted = s
+                self.camera.frame_output.append((frame, captured_at, leases))
+
+
+class CaptureThread(threading.Thread):
+    """Owns the camera's cv2.VideoCapture: opens it, reads frames into the pipeline and releases it, so that a
+    slow camera never blocks the Kivy main thread."""
+
+    def __init__(self, camera):
+        super().__init__()
+        self.camera = camera
+        self.daemon = True
+        self.stop_event = threading.Event()
+
+    def run(self):
+        camera = self.camera
+        device = cv2.VideoCapture(camera._index)
+        try:
+            device.set(cv2.CAP_PROP_FRAME_WIDTH, camera._resolution[0])
+            device.set(cv2.CAP_PROP_FRAME_HEIGHT, camera._resolution[1])
+
+            while not self.stop_event.is_set():
+                # read straight into a free preallocated buffer; cv2 allocates one if it is missing or the wrong size
+                ring = camera.capture_ring
+                index, buf = ring.acquire()
+                start = time.perf_counter()
+                ret, frame = device.read() if buf is None else device.read(buf)
+                camera.stats.record('capture', time.perf_counter() - start)
+
+                if not ret:
+                    ring.release(index)
+                    self.stop_event.wait(FRAME_TIMEOUT)
+                    continue
+                if frame is not buf:
+                    ring[index] = frame
+
+                camera.frame_input.append((next(camera._frame_seq), frame, time.perf_counter(), ((ring, index),)))
+                camera.stats.count('captured')
+        except Exception:
+            Logger.exception('OpenCV: Couldn\'t get image from Camera')
+        finally:
+            device.release()
+
+    def stop(self):
+        self.stop_event.set()
+        if self.is_alive() and self is not threading.current_thread():
+            self.join(CAPTURE_TIMEOUT)
 
 
 class MyDeque(deque):
-    def __init__(self):
-        super().__init__(maxlen=1)
-        self.not_empty = threading.Event()
-        self.not_empty.set()
+    """Bounded, latest-wins handoff of frames between threads.
 
-    def append(self, elem):
-        super().append(elem)
-        self.not_empty.set()
+    Appending to a full deque drops the oldest frame (counted in ``stats.dropped`` and passed to ``on_drop``, e.g.
+    release_frame() to reuse its buffers); pop() blocks until a frame is available or the timeout expires.
+    """
 
-    def pop(self):
-        self.not_empty.wait()  # Wait until not empty, or next append call
-        if not (len(self) - 1):
-            self.not_empty.clear()
-        return super().pop()
+    def __init__(self, maxlen=1, stats=None, on_drop=None):
+        super().__init__(maxlen=maxlen)
+        self.stats = stats
+        self.on_drop = on_drop
+        self.not_empty = threading.Condition()
 
+    def append(self, elem):
+        with self.not_empty:
+            if len(self) == self.maxlen:
+                if self.stats is not None:
+                    self.stats.count('dropped')
+                if self.on_drop is not None:
+                    self.on_drop(self[0])
+            super().append(elem)
+            self.not_empty.notify()
+
+    def pop(self, block=True, timeout=None):
+        """Remove and return the newest frame; raises IndexError if none arrives (or, if not block, if empty)."""
+        with self.not_empty:
+            if block and not self.not_empty.wait_for(lambda: len(self) > 0, timeout):
+                raise IndexError('pop from an empty deque')
+            return super().pop()
+
+
+_devices = None
+_pinned_devices = None
+_devices_lock = threading.Lock()
+
+
+def pin_devices(indices):
+    """Use the given camera indices instead of probing for devices (None to probe again)."""
+    global _pinned_devices
+    _pinned_devices = None if indices is None else list(indices)
+
+
+def _probe_device(index, found):
+    cap = cv2.VideoCapture(index)
+    try:
+        if cap.isOpened() and cap.read()[0]:
+            found.append(index)
+    except Exception:
+        pass
+    finally:
+        cap.release()
+
+
+def list_devices(refresh=False, timeout=PROBE_TIMEOUT):
+    """Return the indices of the available cameras.
+
+    Indices 0..MAX_DEVICES-1 are probed in parallel the first time this is called (or if refresh is set), and the
+    result is cached. Probes still running after timeout seconds are ignored. Pinned indices (see pin_devices())
+    are returned without probing at all.
+    """
+    global _devices
+    if _pinned_devices is not None:
+        return list(_pinned_devices)
+
+    with _devices_lock:
+        if _devices is None or refresh:
+            found = []
+            # daemon threads, so that a probe hung on a broken device can't hold up exit
+            probes = [threading.Thread(target=_probe_device, args=(index, found), daemon=True)
+                      for index in range(MAX_DEVICES)]
+            for probe in probes:
+                probe.start()
+            deadline = time.monotonic() + timeout
+            for probe in probes:
+                probe.join(max(deadline - time.monotonic(), 0))
+            _devices = sorted(found)
+        return list(_devices)
+
+
+def cached_devices():
+    """Return the pinned or cached camera indices without probing, or None if the cameras haven't been listed."""
+    if _pinned_devices is not None:
+        return list(_pinned_devices)
+    devices = _devices
+    return None if devices is None else list(devices)
+
+
+def list_devices_async(callback, refresh=False):
+    """Call list_devices() on a worker thread, then callback(devices) on the Kivy main thread."""
+    def probe():
+        devices = list_devices(refresh)
+        Clock.schedule_once(lambda dt: callback(devices))
+
+    threading.Thread(target=probe, daemon=True).start()
 
-class MyOpenCVCamera(CameraOpenCV):
-    def __init__(self, processor=None, **kwargs):
-        super().__init__(**kwargs)
 
+class MyOpenCVCamera(CameraOpenCV):
+    def __init__(self, processor=None, workers=1, worker_type='thread', ordering='ordered', in_place=False,
+                 **kwargs):
         self.processor = processor
+        self.in_place = in_place
+        self.workers = workers
+        self.worker_type = worker_type
+        self.ordering = ordering
 
-        self.frame_input = MyDeque()
-        self.frame_output = MyDeque()
+        self.stats = FrameStats()
+        self.frame_input = MyDeque(stats=self.stats, on_drop=release_frame)
+        self.frame_output = MyDeque(stats=self.stats, on_drop=release_frame)
+        self._frame_seq = itertools.count()
+
+        self.pool = None
+        self.capture = None
+        self.capture_ring = FrameRing(ring_size(workers))
+        self._last_display = None  # when the last frame was displayed, to spot stalls
+
+        super().__init__(**kwargs)
 
-        self.worker = None
+    def configure_pool(self, workers=None, worker_type=None, ordering=None, processor=None, in_place=None):
+        """Change the processor and/or processing pool, restarting the pool if it is running."""
+        self.in_place = self.in_place if in_place is None else in_place
+        self.workers = self.workers if workers is None else workers
+        self.worker_type = self.worker_type if worker_type is None else worker_type
+        self.ordering = self.ordering if ordering is None else ordering
+        self.processor = self.processor if processor is None else processor
+        if self.pool is not None:
+            self._start_pool()
+
+    def _start_pool(self):
+        if self.pool is not None:
+            self.pool.stop()
+        self.pool = ProcessorPool(self, self.workers, self.worker_type, self.ordering)
+        self.capture_ring = FrameRing(ring_size(self.workers))
+        self.pool.start()
+
+    def _start_capture(self):
+        if self.capture is not None:
+            self.capture.stop()
+        self.capture = CaptureThread(self)
+        self.capture.start()
+
+    def init_camera(self):
+        # the device is opened and read on the capture thread, never on the main thread; _update only polls for
+        # processed frames
+        self.fps = 1. / DISPLAY_FPS
+        if self.capture is not None:
+            self._start_capture()  # index or resolution changed
 
     def start(self):
+        self._last_display = None
         super().start()
-        if self.worker is not None:
-            self.worker.stop_event.set()
-        self.worker = WorkerThread(self)
-        self.worker.start()
+        self._start_pool()
+        self._start_capture()
 
     def stop(self):
         super().stop()
-        if self.worker is not None:
-            self.worker.stop_event.set()
-        self._device.release()
+        if self.capture is not None:
+            self.capture.stop()
+            self.capture = None
+        if self.pool is not None:
+            self.pool.stop()
+            self.pool = None
 
     @staticmethod
-    def list_devices():
-        index = 0
-        arr = []
-        i = MAX_DEVICES
-        while i > 0:
-            cap = cv2.VideoCapture(index)
-            if cap.read()[0]:
-                arr.append(index)
-                cap.release()
-            index += 1
-            i -= 1
-        return arr
+    def list_devices(refresh=False):
+        return list_devices(refresh)
 
     def _update(self, dt):
         if self.stopped:
             return
-        if self._texture is None:
-            # Create the texture
-            self._texture = Texture.create(self._resolution)
-            self._texture.flip_vertical()
-            self.dispatch('on_load')
-        try:
-            ret, frame = self._device.read()
 
-            self.frame_input.append(frame)
+        start = time.perf_counter()
+        try:
+            frame, captured_at, leases = self.frame_output.pop(block=False)
+        except IndexError:
+            return  # no new processed frame yet
 
+        try:
+            resolution = (frame.shape[1], frame.shape[0])
+            if self._texture is None or self._texture.size != resolution:
+                # Create the texture
+                self._resolution = resolution
+                self._texture = Texture.create(self._resolution)
+                self._texture.flip_vertical()
+                self.dispatch('on_load')
+
+            self._format = 'bgr'
             try:
-                frame = self.frame_output.pop()
-
-                self._format = 'bgr'
-                try:
-                    self._buffer = frame.imageData
-                except AttributeError:
-                    # frame is already of type ndarray
-                    # which can be reshaped to 1-d.
-                    self._buffer = frame.reshape(-1)
-
-                self._copy_to_gpu()
-            except IndexError:
-                # drop frame
-                pass
+                self._buffer = frame.imageData
+            except AttributeError:
+                # frame is already of type ndarray which can be reshaped to 1-d; a view (no copy) when it is
+                # contiguous, which ring buffers always are
+                self._buffer = frame.reshape(-1)
+
+            self._copy_to_gpu()
+            self.stats.record_upload(frame.nbytes)
+            self.stats.count('displayed')
+            self.stats.record('display', time.perf_counter() - captured_at)
         except:
-            Logger.exception('OpenCV: Couldn\'t get image from Camera')
+            Logger.exception('OpenCV: Couldn\'t display image from Camera')
+        finally:
+            release(leases)  # the texture upload has copied the frame
+        end = time.perf_counter()
+        self.stats.record('ui_update', end - start)
+        instruments.sample('camera_update', end - start)
+        if self._last_display is not None and start - self._last_display > CAMERA_STALL:
+            instruments.record('camera_stall', start - self._last_display, self._last_display)
+        self._last_display = end
 
 
 class MyUIXCamera(Camera):
     processor = ObjectProperty(None)
+    workers = NumericProperty(1)
+    '''Number of workers the processor runs on in parallel
+    '''
+    worker_type = OptionProperty('thread', options=['thread', 'process'])
+    '''Whether the processor runs on worker threads or worker processes (which need a picklable processor)
+    '''
+    ordering = OptionProperty('ordered', options=['ordered', 'latest'])
+    '''Whether processed frames are displayed in capture order, or as soon as they are ready
+    '''
+    in_place = BooleanProperty(False)
+    '''Whether the processor is called as processor(frame, out=buffer), writing into a preallocated buffer
+    '''
 
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
         self.fbind('processor', self._on_processor)
+        self.fbind('workers', self._on_processor)
+        self.fbind('worker_type', self._on_processor)
+        self.fbind('ordering', self._on_processor)
+        self.fbind('in_place', self._on_processor)
 
     def _on_processor(self, *args):
         if self._camera is not None:
-            self._camera.processor = self.processor
+            self._camera.configure_pool(self.workers, self.worker_type, self.ordering, self.processor,
+                                        self.in_place)
 
     def _on_index(self, *args):
         self._camera = None
         if self.index < 0:
             return
+        options = dict(processor=self.processor, workers=self.workers, worker_type=self.worker_type,
+                       ordering=self.ordering, in_place=self.in_place, index=self.index, stopped=True)
         if self.resolution[0] < 0 or self.resolution[1] < 0:
-            self._camera = MyOpenCVCamera(processor=self.processor, index=self.index, stopped=True)
+            self._camera = MyOpenCVCamera(**options)
         else:
-            self._camera = MyOpenCVCamera(processor=self.processor, index=self.index,
-                                          resolution=self.resolution, stopped=True)
+            self._camera = MyOpenCVCamera(resolution=self.resolution, **options)
         if self.play:
             self._camera.start()
 
         self._camera.bind(on_texture=self.on_tex)
 
     def close(self):
-        self._camera.stop()
+        if self._camera is not None:
+            self._camera.stop()
 
 
 Builder.load_string('''
@@ -168,6 +731,10 @@ Builder.load_string('''
             index: -1 if len(_camera_index.text) == 0 else int(_camera_index.text)
             play: True
             processor: root.processor
+            workers: root.workers
+            worker_type: root.worker_type
+            ordering: root.ordering
+            in_place: root.in_place
         AnchorLayout:
             anchor_x: 'center'
             anchor_y: 'bottom'
@@ -183,24 +750,65 @@ Builder.load_string('''
 
 class VideoCaptureWidget(FloatLayout):
     processor = ObjectProperty(None)
+    workers = NumericProperty(1)
+    worker_type = OptionProperty('thread', options=['thread', 'process'])
+    ordering = OptionProperty('ordered', options=['ordered', 'latest'])
+    in_place = BooleanProperty(False)
     camera = ObjectProperty(None)
-    cams = ObjectProperty([str(x) for x in MyOpenCVCamera.list_devices()])
+    cams = ObjectProperty([])
 
-    def __init__(self, **kwargs):
+    def __init__(self, devices=None, **kwargs):
         super().__init__(**kwargs)
+        self._closed = False
+        # enumerate on first use rather than at import, and never on the main thread: until a probe on a worker
+        # thread finishes there are no cameras to offer. Probing is cached, and skipped if devices are given
+        if devices is None:
+            devices = cached_devices()
+        if devices is None:
+            list_devices_async(self._on_devices)
+        else:
+            self._on_devices(devices)
+
+    def _on_devices(self, devices):
+        if not self._closed:  # the slide may have been left while probing
+            self.cams = [str(x) for x in devices]
+
+    def close(self):
+        self._closed = True
+        self.camera.close()
 
 
 class VideoCaptureSlide(Slide):
-    def __init__(self, processor=None, **kwargs):
+    cacheable = BooleanProperty(defaultvalue=False)  # never keep a live camera open off screen
+
+    def __init__(self, processor=None, workers=1, worker_type='thread', ordering='ordered', in_place=False,
+                 devices=None, **kwargs):
+        """
+        :param processor: optional function applied to every captured frame (a BGR ndarray); it may return None
+                          when there is nothing new to display
+        :param workers: number of workers the processor runs on in parallel
+        :param worker_type: 'thread' or 'process'; process workers need a picklable (module level) processor
+        :param ordering: 'ordered' to display processed frames in capture order, or 'latest' to display each
+                         frame as soon as it is ready
+        :param in_place: call the processor as processor(frame, out=buffer) with a preallocated buffer to write
+                         its result into, rather than allocating a new array per frame
+        :param devices: camera indices to offer, skipping probing for devices
+        """
         super().__init__(**kwargs)
 
         self.processor = processor
+        self.workers = workers
+        self.worker_type = worker_type
+        self.ordering = ordering
+        self.in_place = in_place
+        self.devices = devices
         self.vc = None
 
     def build(self):
-        self.vc = VideoCaptureWidget(processor=self.processor)
+        self.vc = VideoCaptureWidget(processor=self.processor, workers=self.workers, worker_type=self.worker_type,
+                                     ordering=self.ordering, in_place=self.in_place, devices=self.devices)
         self.add_widget(self.vc)
 
     def close(self):
-        self.vc.camera.close()
+        self.vc.close()
         self.vc = None
@@ -0,0 +1,6 @@
+import os
+
+# importing slideshow imports kivy: keep it from parsing pytest's arguments or opening a window
+os.environ.setdefault('KIVY_NO_ARGS', '1')
+os.environ.setdefault('KIVY_NO_CONSOLELOG', '1')
+os.environ.setdefault('KIVY_WINDOW', '')
@@ -0,0 +1,29 @@
+from array import array
+from types import SimpleNamespace
+
+from slideshow.annotations import AnnotationStore
+
+
+def stroke(*points):
+    # AnnotationStore only needs these attributes; a real Stroke needs a GL context for its instructions
+    return SimpleNamespace(color=(1., 0., 0., 1.), width=2., points=array('f', points))
+
+
+def test_append_after_a_torn_record_is_truncated(tmp_path):
+    path = str(tmp_path / 'deck.annotations')
+    store = AnnotationStore(path)
+    store.append(0, False, stroke(1, 2, 3, 4))
+    store.close()
+    with open(path, 'ab') as file:
+        file.write(b'\x01\x00torn')  # the start of a record that was being written when the slideshow stopped
+
+    store = AnnotationStore(path)
+    store.append(1, True, stroke(5, 6, 7, 8))
+    assert list(store.read(1)) == [(True, (1., 0., 0., 1.), 2., array('f', [5, 6, 7, 8]))]
+    store.close()
+
+    store = AnnotationStore(path)
+    assert store.slides() == [0, 1]
+    assert [points for _, _, _, points in store.read(0)] == [array('f', [1, 2, 3, 4])]
+    assert [points for _, _, _, points in store.read(1)] == [array('f', [5, 6, 7, 8])]
+    store.close()
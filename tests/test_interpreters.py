@@ -0,0 +1,28 @@
+import threading
+
+from slideshow.shells.interpreters import InterpreterPool
+
+TIMEOUT = 2  # seconds to wait for the pool to run something
+
+
+def test_closing_a_busy_session_frees_its_worker():
+    pool = InterpreterPool(workers=2)
+    release = threading.Event()
+    started = [threading.Event() for _ in range(2)]
+
+    # a slide per worker, each left while its code is still running
+    for event in started:
+        session = pool.session(lambda s: None)
+        session.submit(lambda event=event: (event.set(), release.wait()))
+        assert event.wait(TIMEOUT)
+        session.close()
+
+    output = []
+    session = pool.session(output.append)
+    done = threading.Event()
+    session.submit(lambda: (print('ran'), done.set()))
+    assert done.wait(TIMEOUT)
+    assert ''.join(output) == 'ran\n'
+    assert len(pool.workers) == 2
+
+    release.set()
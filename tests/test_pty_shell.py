@@ -0,0 +1,140 @@
+import os
+import queue
+import time
+
+import pytest
+
+from slideshow.shells import pty_shell
+from slideshow.shells.pty_shell import PtyShell, SENTINEL_START
+
+pytestmark = pytest.mark.skipif(not pty_shell.available(), reason='pseudo terminals are not supported')
+
+TIMEOUT = 5  # seconds to wait for the shell to respond
+
+
+class StandIn(object):
+    """A /bin/sh session with a fixed rc file, recording what PtyShell reports."""
+
+    def __init__(self, tmp_path, rc=''):
+        rc_file = tmp_path / 'shrc'
+        rc_file.write_text("PS1=''\n" + rc)
+        self.chunks = []
+        self.completions = queue.Queue()
+        self.shell = PtyShell(['/bin/sh', '+m'], self.chunks.append, lambda *args: self.completions.put(args),
+                              cwd=str(tmp_path), env={'ENV': str(rc_file)})
+
+    @property
+    def output(self):
+        return ''.join(self.chunks)
+
+    def complete(self):
+        return self.completions.get(timeout=TIMEOUT)
+
+    def run(self, command_line):
+        """Run a command line, returning its output, exit status and working directory."""
+        del self.chunks[:]
+        self.shell.run(command_line)
+        status, cwd = self.complete()
+        return self.output, status, cwd
+
+
+@pytest.fixture
+def session(tmp_path):
+    session = StandIn(tmp_path, rc='greet() { echo "hello $1"; }\n')
+    yield session
+    session.shell.close()
+
+
+def test_output_is_exactly_what_the_command_writes(session, tmp_path):
+    # no echo of the command line, no \r\n from output post-processing and no sentinel
+    output, status, cwd = session.run('printf "one\\ntwo\\n"')
+    assert output == 'one\ntwo\n'
+    assert status == 0
+    assert cwd == os.path.realpath(str(tmp_path))
+
+
+def test_exit_status_is_reported(session):
+    assert session.run('false')[1] == 1
+    assert session.run('(exit 3)')[1] == 3
+    assert session.run('true')[1] == 0
+
+
+def test_status_is_kept_for_the_next_command(session):
+    # the sentinel command leaves $? as the command set it
+    session.run('(exit 7)')
+    assert session.run('echo $?')[0] == '7\n'
+
+
+def test_rc_file_is_read(session):
+    assert session.run('greet world')[0] == 'hello world\n'
+
+
+def test_working_directory_persists(session, tmp_path):
+    (tmp_path / 'sub').mkdir()
+    output, status, cwd = session.run('cd sub')
+    expected = os.path.realpath(str(tmp_path / 'sub'))
+    assert (output, status, cwd) == ('', 0, expected)
+    assert session.shell.cwd == expected
+    assert session.run('pwd')[0] == expected + '\n'
+
+
+def test_environment_persists(session):
+    session.run('export SLIDESHOW_TEST=persisted')
+    session.run('unused=1')
+    assert session.run('echo $SLIDESHOW_TEST $unused')[0] == 'persisted 1\n'
+
+
+def test_sentinel_start_in_output_is_passed_through(session):
+    output, status, _ = session.run("printf 'a\\036b\\n\\036'")
+    assert output == 'a' + SENTINEL_START + 'b\n' + SENTINEL_START
+    assert status == 0
+
+
+def test_large_output_is_streamed_whole(session):
+    output, status, _ = session.run('seq 1 20000')
+    assert output == ''.join('%d\n' % i for i in range(1, 20001))
+    assert len(session.chunks) > 1
+
+
+def test_interrupt_stops_the_command_but_not_the_shell(session):
+    del session.chunks[:]
+    session.shell.run('sleep 30')
+    time.sleep(0.5)
+    start = time.monotonic()
+    session.shell.interrupt()
+    status, _ = session.complete()
+    assert status == 128 + 2  # killed by SIGINT
+    assert time.monotonic() - start < TIMEOUT
+
+    # completed once, although the sentinel is sent again by interrupt()
+    assert session.run('echo after')[:2] == ('after\n', 0)
+    assert session.completions.empty()
+    assert session.shell.alive
+
+
+def test_interrupt_when_the_command_read_the_sentinel(session):
+    # cat consumes the sentinel command from its stdin, so only the one sent by interrupt() arrives
+    session.shell.run('cat > /dev/null')
+    time.sleep(0.5)
+    session.shell.interrupt()
+    assert session.complete()[0] == 128 + 2
+    assert session.run('echo after')[:2] == ('after\n', 0)
+
+
+def test_close_tears_down_the_session(session):
+    session.shell.run('sleep 30')
+    time.sleep(0.2)
+    session.shell.close()
+    assert session.complete() == (None, None)
+    assert not session.shell.alive
+    session.shell._reader.join(TIMEOUT)
+    assert not session.shell._reader.is_alive()
+    with pytest.raises(OSError):
+        os.fstat(session.shell._fd)  # the terminal has been closed
+
+
+def test_shell_exiting_is_reported(session):
+    session.shell.run('exit 0')
+    assert session.complete() == (None, None)
+    session.shell._reader.join(TIMEOUT)
+    assert not session.shell.alive
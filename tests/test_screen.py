@@ -0,0 +1,32 @@
+from slideshow.shells.screen import ScreenBuffer
+
+
+def lines(screen):
+    return [screen[i] for i in range(screen.first_line, screen.end_line)]
+
+
+def test_escape_sequences_are_dropped():
+    screen = ScreenBuffer()
+    screen.feed('ok \x1b[31mred\x1b[0m \x1b]0;title\x07done\n')
+    assert lines(screen) == ['ok red done', '']
+
+
+def test_escape_sequence_split_across_feeds_is_dropped():
+    screen = ScreenBuffer()
+    screen.feed('ok \x1b[3')
+    assert lines(screen) == ['ok ']
+    screen.feed('1mred\x1b[0m\n')
+    assert lines(screen) == ['ok red', '']
+
+
+def test_escape_split_after_the_escape_character():
+    screen = ScreenBuffer()
+    for chunk in ('a\x1b', '[1mb\x1b]0;ti', 'tle\x1b', '\\c\n'):
+        screen.feed(chunk)
+    assert lines(screen) == ['abc', '']
+
+
+def test_carriage_return_and_backspace_overwrite():
+    screen = ScreenBuffer()
+    screen.feed('50%\r100%\nab\bc\n')
+    assert lines(screen) == ['100%', 'ac', '']